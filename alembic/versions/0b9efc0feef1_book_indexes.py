@@ -0,0 +1,33 @@
+"""book indexes
+
+Revision ID: 0b9efc0feef1
+Revises: f4796b46c364
+Create Date: 2026-10-19 10:12:05.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0b9efc0feef1'
+down_revision: Union[str, None] = 'f4796b46c364'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# CREATE INDEX CONCURRENTLY does not block writes but cannot run inside a transaction, so every index is built in an
+# autocommit block. A failed concurrent build leaves an INVALID index behind, drop it before running the upgrade again.
+COLUMNS = ['user_id', 'author', 'publisher', 'language', 'created_at']
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.create_index(op.f(f'ix_books_{column}'), 'books', [column], unique=False, postgresql_concurrently=True,
+                            if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for column in reversed(COLUMNS):
+            op.drop_index(op.f(f'ix_books_{column}'), table_name='books', postgresql_concurrently=True, if_exists=True)
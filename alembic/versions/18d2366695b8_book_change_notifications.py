@@ -0,0 +1,53 @@
+"""book change notifications
+
+Revision ID: 18d2366695b8
+Revises: 2a2429185c67
+Create Date: 2026-10-19 18:33:01.865939
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '18d2366695b8'
+down_revision: Union[str, None] = '2a2429185c67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# One notification per statement and 500 ids, a payload must stay below 8000 bytes. Notifications are only
+# delivered when the transaction commits, listeners never hear of rolled back writes.
+NOTIFY_TRIGGERS = """
+CREATE FUNCTION books_notify_changed() RETURNS trigger AS $$
+DECLARE
+    ids integer[];
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        ids := ARRAY(SELECT id FROM old_books ORDER BY id);
+    ELSE
+        ids := ARRAY(SELECT id FROM new_books ORDER BY id);
+    END IF;
+    FOR start_index IN 1..coalesce(array_length(ids, 1), 0) BY 500 LOOP
+        PERFORM pg_notify('book_changes', json_build_object('op', lower(TG_OP), 'ids', ids[start_index:start_index + 499])::text);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_notify_insert AFTER INSERT ON books REFERENCING NEW TABLE AS new_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_notify_changed();
+CREATE TRIGGER books_notify_update AFTER UPDATE ON books REFERENCING NEW TABLE AS new_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_notify_changed();
+CREATE TRIGGER books_notify_delete AFTER DELETE ON books REFERENCING OLD TABLE AS old_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_notify_changed()
+"""
+
+
+def upgrade() -> None:
+    op.execute(NOTIFY_TRIGGERS)
+
+
+def downgrade() -> None:
+    for trigger in ('books_notify_insert', 'books_notify_update', 'books_notify_delete'):
+        op.execute(f"DROP TRIGGER {trigger} ON books")
+    op.execute("DROP FUNCTION books_notify_changed()")
@@ -0,0 +1,50 @@
+"""book tombstones
+
+Revision ID: 2a2429185c67
+Revises: 6e098221d4f9
+Create Date: 2026-10-19 18:30:32.060790
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '2a2429185c67'
+down_revision: Union[str, None] = '6e098221d4f9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# A statement level trigger so every way of deleting books, one at a time or in bulk, leaves tombstones.
+# LOCALTIMESTAMP is the start of the transaction like the now() default of books.updated_at.
+TOMBSTONE_TRIGGER = """
+CREATE FUNCTION books_tombstones_deleted() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO book_tombstones (book_id, deleted_at)
+    SELECT id, LOCALTIMESTAMP FROM old_books ORDER BY id
+    ON CONFLICT (book_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_tombstones_delete AFTER DELETE ON books REFERENCING OLD TABLE AS old_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_tombstones_deleted()
+"""
+
+
+def upgrade() -> None:
+    op.create_table('book_tombstones',
+                    sa.Column('book_id', sa.Integer(), autoincrement=False, nullable=False),
+                    sa.Column('deleted_at', sa.TIMESTAMP(), nullable=False),
+                    sa.PrimaryKeyConstraint('book_id'))
+    op.create_index('ix_book_tombstones_deleted_at_book_id', 'book_tombstones', ['deleted_at', 'book_id'], unique=False)
+    op.execute(TOMBSTONE_TRIGGER)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER books_tombstones_delete ON books")
+    op.execute("DROP FUNCTION books_tombstones_deleted()")
+    op.drop_index('ix_book_tombstones_deleted_at_book_id', table_name='book_tombstones')
+    op.drop_table('book_tombstones')
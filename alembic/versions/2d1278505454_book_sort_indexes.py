@@ -0,0 +1,34 @@
+"""book sort indexes
+
+Revision ID: 2d1278505454
+Revises: 0b9efc0feef1
+Create Date: 2026-10-19 11:40:51.370522
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '2d1278505454'
+down_revision: Union[str, None] = '0b9efc0feef1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (page_count, id) serves page_count ranges sorted with the id tie break, (language, id) serves a language listed by id
+# and makes ix_books_language redundant. Built concurrently outside a transaction, like 0b9efc0feef1.
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_books_page_count_id', 'books', ['page_count', 'id'], unique=False, postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.create_index('ix_books_language_id', 'books', ['language', 'id'], unique=False, postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.drop_index('ix_books_language', table_name='books', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_books_language', 'books', ['language'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_books_language_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_books_page_count_id', table_name='books', postgresql_concurrently=True, if_exists=True)
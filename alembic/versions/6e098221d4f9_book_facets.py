@@ -0,0 +1,108 @@
+"""book facets
+
+Revision ID: 6e098221d4f9
+Revises: 93863a668675
+Create Date: 2026-10-19 18:28:37.110191
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '6e098221d4f9'
+down_revision: Union[str, None] = '93863a668675'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FACETS = ('language', 'publisher', 'author')
+UNION_ALL = "\n            UNION ALL "
+
+
+def counted(source: str, delta: int) -> str:
+    """
+    :param source: relation with the books columns
+    :param delta: added to the count of every facet value of a row
+    :return: query of (facet, value, delta) rows
+    """
+    return UNION_ALL.join(f"SELECT '{facet}', {facet}, {delta} FROM {source} WHERE {facet} IS NOT NULL" for facet in FACETS)
+
+
+def moved() -> str:
+    """
+    :return: CTEs with both sides of the updated rows whose language, publisher or author changed
+    """
+    new, old = (", ".join(f"{table}.{facet}" for facet in FACETS) for table in ('new_books', 'old_books'))
+    return (f"WITH moved AS (SELECT id FROM new_books JOIN old_books USING (id) WHERE ({new}) IS DISTINCT FROM ({old})),\n"
+            "    moved_new AS (SELECT new_books.* FROM new_books JOIN moved USING (id)),\n"
+            "    moved_old AS (SELECT old_books.* FROM old_books JOIN moved USING (id))")
+
+
+def apply_deltas(deltas: str, ctes: str = "") -> str:
+    """
+    Adds the summed deltas to book_facets. Rows are upserted in key order, so concurrent statements
+    lock the counters they share in the same order and cannot deadlock.
+    """
+    ctes = f"\n    {ctes}" if ctes else ""
+    return f"""{ctes}
+    INSERT INTO book_facets (facet, value, count)
+    SELECT facet, value, sum(delta) FROM (
+            {deltas}
+    ) AS deltas (facet, value, delta)
+    GROUP BY facet, value HAVING sum(delta) <> 0
+    ORDER BY facet, value
+    ON CONFLICT (facet, value) DO UPDATE SET count = book_facets.count + EXCLUDED.count;"""
+
+
+# Statement level triggers with transition tables like the book_count ones, a bulk write touches every counter once.
+# Values whose books are all gone keep a row with count 0, reads skip them.
+FACET_TRIGGERS = f"""
+CREATE FUNCTION books_facets_inserted() RETURNS trigger AS $$
+BEGIN{apply_deltas(counted('new_books', 1))}
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION books_facets_deleted() RETURNS trigger AS $$
+BEGIN{apply_deltas(counted('old_books', -1))}
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only rows whose language, publisher or author changed move a count.
+CREATE FUNCTION books_facets_updated() RETURNS trigger AS $$
+BEGIN{apply_deltas(counted('moved_new', 1) + UNION_ALL + counted('moved_old', -1), moved())}
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_facets_insert AFTER INSERT ON books REFERENCING NEW TABLE AS new_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_facets_inserted();
+CREATE TRIGGER books_facets_delete AFTER DELETE ON books REFERENCING OLD TABLE AS old_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_facets_deleted();
+CREATE TRIGGER books_facets_update AFTER UPDATE ON books REFERENCING OLD TABLE AS old_books NEW TABLE AS new_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_facets_updated()
+"""
+
+
+def upgrade() -> None:
+    op.create_table('book_facets',
+                    sa.Column('facet', sa.String(), nullable=False),
+                    sa.Column('value', sa.String(), nullable=False),
+                    sa.Column('count', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('facet', 'value'))
+    op.create_index('ix_book_facets_facet_count_value', 'book_facets', ['facet', sa.text('count DESC'), 'value'], unique=False)
+    # Creating the triggers locks out writes to books until the commit, the backfill sees every row exactly once.
+    op.execute(FACET_TRIGGERS)
+    op.execute(apply_deltas(counted('books', 1)).rstrip(';'))
+
+
+def downgrade() -> None:
+    for trigger in ('books_facets_insert', 'books_facets_delete', 'books_facets_update'):
+        op.execute(f"DROP TRIGGER {trigger} ON books")
+    for function in ('books_facets_inserted', 'books_facets_deleted', 'books_facets_updated'):
+        op.execute(f"DROP FUNCTION {function}()")
+    op.drop_index('ix_book_facets_facet_count_value', table_name='book_facets')
+    op.drop_table('book_facets')
@@ -0,0 +1,92 @@
+"""user books index and count
+
+Revision ID: 76c8b7cf5202
+Revises: b1cc0634e36d
+Create Date: 2026-10-19 14:22:48.511093
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '76c8b7cf5202'
+down_revision: Union[str, None] = 'b1cc0634e36d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Statement level triggers with transition tables, a bulk insert or delete updates every owner once
+# instead of once per row. They also cover COPY and writes that bypass the app.
+COUNT_TRIGGERS = """
+CREATE FUNCTION books_count_inserted() RETURNS trigger AS $$
+BEGIN
+    UPDATE users SET book_count = users.book_count + added.books
+    FROM (SELECT user_id, count(*) AS books FROM new_books WHERE user_id IS NOT NULL GROUP BY user_id) AS added
+    WHERE users.id = added.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE FUNCTION books_count_deleted() RETURNS trigger AS $$
+BEGIN
+    UPDATE users SET book_count = users.book_count - removed.books
+    FROM (SELECT user_id, count(*) AS books FROM old_books WHERE user_id IS NOT NULL GROUP BY user_id) AS removed
+    WHERE users.id = removed.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only rows that changed owner move a count, other updates leave users untouched.
+CREATE FUNCTION books_count_moved() RETURNS trigger AS $$
+BEGIN
+    UPDATE users SET book_count = users.book_count + moved.books
+    FROM (
+        SELECT user_id, sum(delta) AS books FROM (
+            SELECT new_books.user_id, 1 AS delta FROM new_books JOIN old_books USING (id)
+            WHERE new_books.user_id IS DISTINCT FROM old_books.user_id
+            UNION ALL
+            SELECT old_books.user_id, -1 AS delta FROM new_books JOIN old_books USING (id)
+            WHERE new_books.user_id IS DISTINCT FROM old_books.user_id
+        ) AS changes
+        WHERE user_id IS NOT NULL GROUP BY user_id
+    ) AS moved
+    WHERE users.id = moved.user_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER books_count_insert AFTER INSERT ON books REFERENCING NEW TABLE AS new_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_count_inserted();
+CREATE TRIGGER books_count_delete AFTER DELETE ON books REFERENCING OLD TABLE AS old_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_count_deleted();
+CREATE TRIGGER books_count_update AFTER UPDATE ON books REFERENCING OLD TABLE AS old_books NEW TABLE AS new_books
+    FOR EACH STATEMENT EXECUTE FUNCTION books_count_moved()
+"""
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('book_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(COUNT_TRIGGERS)
+    op.execute("""
+        UPDATE users SET book_count = owned.books
+        FROM (SELECT user_id, count(*) AS books FROM books WHERE user_id IS NOT NULL GROUP BY user_id) AS owned
+        WHERE users.id = owned.user_id
+    """)
+    with op.get_context().autocommit_block():
+        op.create_index('ix_books_user_id_created_at_id', 'books', ['user_id', 'created_at', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        # The new index starts with user_id, the single column one only costs writes now.
+        op.drop_index('ix_books_user_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_books_user_id', 'books', ['user_id'], unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_books_user_id_created_at_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+    for trigger in ('books_count_insert', 'books_count_delete', 'books_count_update'):
+        op.execute(f"DROP TRIGGER {trigger} ON books")
+    for function in ('books_count_inserted', 'books_count_deleted', 'books_count_moved'):
+        op.execute(f"DROP FUNCTION {function}()")
+    op.drop_column('users', 'book_count')
@@ -0,0 +1,34 @@
+"""autocomplete indexes
+
+Revision ID: 93863a668675
+Revises: 76c8b7cf5202
+Create Date: 2026-10-19 15:48:12.604390
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '93863a668675'
+down_revision: Union[str, None] = '76c8b7cf5202'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Trigram indexes serve the fuzzy autocomplete fallback, (updated_at, id) the delta refresh of the prefix indexes.
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for column in ('author', 'publisher'):
+            op.create_index(f'ix_books_{column}_trgm', 'books', [column], unique=False, postgresql_using='gin',
+                            postgresql_ops={column: 'gin_trgm_ops'}, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_books_updated_at_id', 'books', ['updated_at', 'id'], unique=False, postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_books_updated_at_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+        for column in ('publisher', 'author'):
+            op.drop_index(f'ix_books_{column}_trgm', table_name='books', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,81 @@
+"""published_date as date
+
+Revision ID: b1cc0634e36d
+Revises: 2d1278505454
+Create Date: 2026-10-19 13:05:27.904416
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b1cc0634e36d'
+down_revision: Union[str, None] = '2d1278505454'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 50_000
+
+# Strings that are not a valid date become NULL instead of failing the migration.
+PARSE_DATE = """
+CREATE FUNCTION books_parse_date(value text) RETURNS date AS $$
+BEGIN
+    RETURN value::date;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+# Keeps the new column in sync with the writes of the running app while the backfill runs.
+SYNC_TRIGGER = """
+CREATE FUNCTION books_sync_published_on() RETURNS trigger AS $$
+BEGIN
+    NEW.published_on := books_parse_date(NEW.published_date);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER books_sync_published_on BEFORE INSERT OR UPDATE OF published_date ON books
+    FOR EACH ROW EXECUTE FUNCTION books_sync_published_on()
+"""
+
+
+def backfill():
+    """
+    Fills published_on in primary key ranges of BATCH_SIZE rows, every batch commits on its own
+    so no long transaction holds row locks or bloats the table.
+    """
+    update = "UPDATE books SET published_on = books_parse_date(published_date) WHERE id >= {low} AND id < {high}"
+    if context.is_offline_mode():
+        op.execute(update.format(low=0, high=2 ** 31 - 1))
+        return
+    bind = op.get_bind()
+    low, high = bind.execute(sa.text("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), -1) FROM books")).one()
+    with op.get_context().autocommit_block():
+        for start in range(low, high + 1, BATCH_SIZE):
+            bind.execute(sa.text(update.format(low=start, high=start + BATCH_SIZE)))
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('published_on', sa.Date(), nullable=True))
+    op.execute(PARSE_DATE)
+    op.execute(SYNC_TRIGGER)
+    backfill()
+    # Rows written since the trigger exists are in sync, the swap only needs a short lock.
+    op.execute("DROP TRIGGER books_sync_published_on ON books")
+    op.execute("DROP FUNCTION books_sync_published_on()")
+    op.execute("DROP FUNCTION books_parse_date(text)")
+    op.drop_column('books', 'published_date')
+    op.alter_column('books', 'published_on', new_column_name='published_date')
+    with op.get_context().autocommit_block():
+        op.create_index(op.f('ix_books_published_date'), 'books', ['published_date'], unique=False, postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_books_published_date'), table_name='books', postgresql_concurrently=True, if_exists=True)
+    op.alter_column('books', 'published_date', type_=sa.String(), postgresql_using="to_char(published_date, 'YYYY-MM-DD')")
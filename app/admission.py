@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette import status
+
+from app.metrics import ADMISSION_IN_FLIGHT, ADMISSION_LIMIT, ADMISSION_QUEUED, ADMISSION_REJECTED, ADMISSION_WAIT
+from config import get_settings
+
+
+class ConcurrencyLimiter:
+    """
+    Limits the requests of a route group executing at once, with a bounded FIFO wait queue.
+    A released slot is handed directly to the oldest waiter.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        ADMISSION_LIMIT.labels(name).set(max_concurrency)
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self) -> str | None:
+        """
+        Wait for a slot.
+        :return: None when admitted, else the rejection reason "queue_full" or "queue_timeout"
+        """
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            self._update_gauges()
+            return None
+        if self.queued >= self.max_queue:
+            return "queue_full"
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        timeout = loop.call_later(self.queue_timeout, lambda: waiter.done() or waiter.set_result(False))
+        self._waiters.append(waiter)
+        self._update_gauges()
+        started = time.perf_counter()
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()  # the slot was handed over just before the client went away
+            self._discard(waiter)
+            raise
+        finally:
+            timeout.cancel()
+            ADMISSION_WAIT.labels(self.name).observe(time.perf_counter() - started)
+        if not admitted:
+            self._discard(waiter)
+            return "queue_timeout"
+        return None
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                self._update_gauges()
+                return
+        self.active -= 1
+        self._update_gauges()
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+        self._update_gauges()
+
+    def _update_gauges(self):
+        ADMISSION_IN_FLIGHT.labels(self.name).set(self.active)
+        ADMISSION_QUEUED.labels(self.name).set(self.queued)
+
+
+@dataclass
+class RouteGroup:
+    prefix: str
+    methods: frozenset[str] | None
+    limiter: ConcurrencyLimiter
+
+    def matches(self, method: str, path: str) -> bool:
+        return path.startswith(self.prefix) and (self.methods is None or method in self.methods)
+
+
+def build_route_groups() -> list[RouteGroup]:
+    """
+    Route groups in match order, requests outside of every group are not limited.
+    :return: route groups
+    """
+    settings = get_settings()
+    timeout = settings.ADMISSION_QUEUE_TIMEOUT
+    reads = frozenset({"GET", "HEAD"})
+    writes = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+    return [
+        RouteGroup('/api/v1/auth/', None,
+                   ConcurrencyLimiter("auth", settings.ADMISSION_AUTH_CONCURRENCY, settings.ADMISSION_AUTH_QUEUE, timeout)),
+        RouteGroup('/api/v1/books/', reads,
+                   ConcurrencyLimiter("books_read", settings.ADMISSION_BOOKS_READ_CONCURRENCY, settings.ADMISSION_BOOKS_READ_QUEUE, timeout)),
+        RouteGroup('/api/v1/books/', writes,
+                   ConcurrencyLimiter("books_write", settings.ADMISSION_BOOKS_WRITE_CONCURRENCY, settings.ADMISSION_BOOKS_WRITE_QUEUE,
+                                      timeout)),
+    ]
+
+
+def register_admission_control(app: FastAPI):
+    """
+    Sheds load with a fast 503 and Retry-After once a route group is saturated, instead of letting latency grow.
+    :param app:
+    :return:
+    """
+    groups: list[RouteGroup] = []
+
+    @app.middleware("http")
+    async def admission_control(request: Request, call_next):
+        settings = get_settings()
+        if not settings.ADMISSION_CONTROL_ENABLED:
+            return await call_next(request)
+        if not groups:
+            groups.extend(build_route_groups())
+        group = next((group for group in groups if group.matches(request.method, request.url.path)), None)
+        if group is None:
+            return await call_next(request)
+        rejected = await group.limiter.acquire()
+        if rejected:
+            ADMISSION_REJECTED.labels(group.limiter.name, rejected).inc()
+            return JSONResponse(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                content={"message": "Server is busy, retry later", "error_code": "overloaded"},
+                headers={"Retry-After": str(settings.ADMISSION_RETRY_AFTER)},
+            )
+        try:
+            return await call_next(request)
+        finally:
+            group.limiter.release()
@@ -12,9 +12,11 @@ from sqlalchemy.orm import Session
 
 from app import models
 from app.auth import schemas
-from app.auth.get_create_user import get_user_by_email
-from app.db_connection import get_db
+from app.auth.get_create_user import get_cached_user_by_email
 from app.models import UserRole
+from app.prepared import TOKEN_BLACKLISTED, run_prepared
+from app.replicas import get_read_db
+from config import get_settings
 
 # to get a string like this run:
 # openssl rand -hex 32
@@ -126,17 +128,20 @@ def blacklist_token(db: Session, token: str):
 
 def is_token_blacklisted(db: Session, token: str) -> bool:
     """
-    Checks if token is blacklisted
+    Checks if token is blacklisted, runs on every authenticated request
     :param db:
     :param token:
     :return:
     """
+    if get_settings().PREPARED_STATEMENTS_ENABLED:
+        return run_prepared(db, TOKEN_BLACKLISTED, lambda statement: db.execute(statement, {"p1": token}).first()) is not None
     return db.query(models.BlacklistedToken).filter(models.BlacklistedToken.token == token).first() is not None
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)) -> schemas.CachedUser:
     """
-    Get Current User
+    Get Current User, read from a replica unless the token was used for a write moments ago, e.g. logout.
+    Write requests are authenticated on their own primary session.
     :param token:
     :param db:
     :return:
@@ -158,7 +163,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     if is_token_blacklisted(db, token):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has been blacklisted")
 
-    user = get_user_by_email(db, email=token_data.email)
+    user = await get_cached_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
     return user
@@ -177,11 +182,11 @@ async def get_current_active_user(current_user: schemas.User = Depends(get_curre
 
 def is_admin(user: schemas.User):
     """
-    Checks if user is admin
+    Checks if user is admin, roles are stored as the UserRole values
     :param user:
     :return:
     """
-    return user.role == UserRole.ADMIN
+    return user.role == UserRole.ADMIN.value
 
 
 async def get_current_admin_user(current_user: schemas.User = Depends(get_current_active_user)):
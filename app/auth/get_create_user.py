@@ -1,7 +1,17 @@
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from app import models
 from app.auth import auth, schemas
+from app.cache import TwoTierCache
+from app.prepared import USER_BY_EMAIL, run_prepared
+from app.replicas import pinned_to_primary, read_session
+from config import get_settings
+
+user_cache = TwoTierCache("users", TypeAdapter(schemas.CachedUser))
 
 
 def get_user_by_id(db: Session, user_id: int):
@@ -13,21 +23,59 @@ def get_user_by_username(db: Session, username: str):
 
 
 def get_user_by_email(db: Session, email: str):
+    if get_settings().PREPARED_STATEMENTS_ENABLED:
+        return run_prepared(db, USER_BY_EMAIL,
+                            lambda statement: db.scalars(select(models.User).from_statement(statement), {"p1": email}).first())
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
+def load_cached_user(email: str) -> schemas.CachedUser | None:
+    """
+    Cache loads are shared by concurrent requests and may outlive the one that started them, they use their own session.
+    :param email:
+    :return: user or None
+    """
+    with read_session() as db:
+        user = get_user_by_email(db, email)
+        return schemas.CachedUser.model_validate(user) if user else None
+
+
+async def get_cached_user_by_email(db: Session, email: str) -> schemas.CachedUser | None:
+    """
+    User by email from the user cache. It is a schema and not a model, updates load the user from the database.
+    Clients pinned to the primary by a recent write read it from there.
+    :param db: only read from when the client is pinned to the primary
+    :param email:
+    :return: user or None
+    """
+    if pinned_to_primary(db):
+        user = await run_in_threadpool(get_user_by_email, db, email)
+        return schemas.CachedUser.model_validate(user) if user else None
+    return await user_cache.get_or_load(email, lambda: run_in_threadpool(load_cached_user, email))
+
+
+def create_user(db: Session, user: schemas.UserCreate) -> models.User | None:
+    """
+    One INSERT ... ON CONFLICT DO NOTHING RETURNING round trip. The unique email and username decide atomically
+    whether the user exists, a separate lookup first would race with concurrent sign-ups.
+    :param db:
+    :param user:
+    :return: new user or None when the email or username is taken
+    """
     hashed_password = auth.get_password_hash(user.password)
-    db_user = models.User(username=user.username, email=user.email, hashed_password=hashed_password, role=user.role)
-    db.add(db_user)
+    statement = insert(models.User).values(username=user.username, email=user.email, hashed_password=hashed_password,
+                                           role=user.role).on_conflict_do_nothing().returning(models.User)
+    db_user = db.scalars(statement).first()
+    if db_user is not None:
+        db.expunge(db_user)  # keeps the returned columns loaded, the commit would expire them
     db.commit()
-    db.refresh(db_user)
     return db_user
 
 
 async def update_user(db: Session, user: models.User, user_data: dict):
     for key, value in user_data.items():
         setattr(user, key, value)
-    await db.commit()
-    db.refresh(db)
+    db.commit()
+    db.refresh(user)
+    await user_cache.invalidate(user.email)
     return user
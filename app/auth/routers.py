@@ -11,9 +11,8 @@ from app.auth.auth import blacklist_token, create_url_safe_token, decode_urlsafe
 from app.auth.dependencies import RoleChecker
 from app.auth.get_create_user import get_user_by_email, update_user
 from app.auth.schemas import EmailSchema, LoginData, PasswordResetConfirmModel, PasswordResetRequestModel
-from app.celery_tasks import send_email_celery
 from app.db_connection import get_db
-from app.mail import mail, send_email_async
+from app.mail import get_mail, send_email_async
 from app.models import UserRole
 
 auth_router = APIRouter(
@@ -38,6 +37,8 @@ auth_router = APIRouter(
 async def send_email(email: EmailSchema, background_tasks: BackgroundTasks):
     subject = "Welcome To Our App"
     # background_tasks.add_task(send_email_async, email.addresses, "Welcome to Nepal", body="")
+    from app.celery_tasks import send_email_celery  # celery is only imported by the routes that enqueue tasks
+
     send_email_celery.delay(addresses=email.addresses, subject=subject, body="")
     return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Email has been sent"})
 
@@ -47,7 +48,7 @@ async def verify_user_account(token: str, db: Session = Depends(get_db)):
     token_data = decode_urlsafe_token(token)
     user_email = token_data.get("email", None)
     if user_email:
-        user = await get_user_by_email(db, email=user_email)
+        user = get_user_by_email(db, email=user_email)
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
         await update_user(db, user, {'is_verified': True})
@@ -109,10 +110,9 @@ async def create_user(user: schemas.UserCreate, background_tasks: BackgroundTask
     :param db:
     :return: user
     """
-    db_user = get_create_user.get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail="User already exists")
     new_user = get_create_user.create_user(db=db, user=user)
+    if new_user is None:
+        raise HTTPException(status_code=400, detail="User already exists")
     domain = os.environ.get('DOMAIN')
     token = create_url_safe_token({"email": user.email})
     link = f"https://{domain}/api/v1/auth/verify/{token}"
@@ -142,11 +142,11 @@ def create_admin_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     :param db:
     :return: admin users.
     """
-    db_user = get_create_user.get_user_by_email(db, email=user.email)
-    if db_user:
-        raise HTTPException(status_code=400, detail="User already exists")
     user.role = UserRole.ADMIN.value
-    return get_create_user.create_user(db=db, user=user)
+    new_user = get_create_user.create_user(db=db, user=user)
+    if new_user is None:
+        raise HTTPException(status_code=400, detail="User already exists")
+    return new_user
 
 
 @auth_router.get("/users/me/", response_model=schemas.User)
@@ -189,7 +189,7 @@ async def password_reset(email_data: PasswordResetRequestModel):
         subject="Reset Password",
         body=html_message,
     )
-    await mail.send_message(message)
+    await get_mail().send_message(message)
     return JSONResponse(content={"message": "Paasword Reset Link Sent, Check Mail"}, status_code=status.HTTP_200_OK)
 
 
@@ -202,7 +202,7 @@ async def reset_account_password(token: str, password: PasswordResetConfirmModel
     token_data = decode_urlsafe_token(token)
     user_email = token_data.get("email", None)
     if user_email:
-        user = await get_user_by_email(db, email=user_email)
+        user = get_user_by_email(db, email=user_email)
         if not user:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
         await update_user(db, user, {'hashed_password': get_password_hash(new_password)})
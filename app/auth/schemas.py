@@ -39,6 +39,19 @@ class User(UserBase):
         from_attributes = True
 
 
+class CachedUser(User):
+    """
+    User fields kept in the user cache, the password hash is never cached.
+    Authenticated routes get this user, it has what they and RoleChecker read.
+    """
+    is_active: bool | None = None
+    is_verified: bool | None = None
+    role: str | None = None
+
+    class Config:
+        from_attributes = True
+
+
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
@@ -0,0 +1,217 @@
+import asyncio
+import heapq
+import logging
+import time
+from bisect import insort
+from datetime import datetime, timedelta
+from typing import Iterable, Literal
+
+from sortedcontainers import SortedList
+from sqlalchemy import func, select, tuple_
+
+from app import models
+from app.metrics import AUTOCOMPLETE_ENTRIES, AUTOCOMPLETE_REQUESTS
+from app.replicas import read_session
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+Field = Literal["author", "publisher"]
+FIELDS: tuple[Field, ...] = ("author", "publisher")
+COLUMNS = {"author": models.Books.author, "publisher": models.Books.publisher}
+
+# Most popular names kept per short prefix, at least the largest page of suggestions.
+CANDIDATES = 200
+# Prefixes up to this length match too many names to rank on every request, they read their kept top names.
+TOP_PREFIX_LENGTH = 3
+DELTA_BATCH = 5000
+
+
+def normalize(value: str) -> str:
+    return " ".join(value.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Sorted index of distinct names, every word of a name is a key, so "tha" finds "Ajay Thakur".
+    A lookup is a range scan of the sorted keys, O(log n) plus the matches, except for short prefixes
+    whose most popular names are kept ranked as names are added.
+    """
+
+    def __init__(self):
+        self._keys = SortedList()  # (name from one of its words on, name), both normalized
+        self._names: dict[str, list] = {}  # normalized name -> [display name, book count]
+        self._top: dict[str, list[tuple[int, str]]] = {}  # short prefix -> (-book count, name) of its top names, sorted
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name: str, count: int = 1):
+        """
+        Idempotent for known names, deltas can be applied more than once.
+        :param name:
+        :param count: books with this name, used for ranking
+        :return:
+        """
+        for key in self._new_keys(name, count):
+            self._keys.add(key)
+
+    def _new_keys(self, name: str, count: int) -> list[tuple[str, str]]:
+        normalized = normalize(name)
+        if not normalized or normalized in self._names:
+            return []
+        self._names[normalized] = [name, count]
+        words = normalized.split(" ")
+        keys = [(" ".join(words[index:]), normalized) for index in range(len(words))]
+        entry = (-count, normalized)
+        for prefix in {key[:length] for key, _ in keys for length in range(1, TOP_PREFIX_LENGTH + 1)}:
+            top = self._top.setdefault(prefix, [])
+            if len(top) < CANDIDATES or entry < top[-1]:
+                insort(top, entry)
+                del top[CANDIDATES:]
+        return keys
+
+    def search(self, prefix: str, limit: int) -> list[str]:
+        """
+        :param prefix:
+        :param limit: at most CANDIDATES
+        :return: names with a word starting with prefix, most books first
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        if len(prefix) <= TOP_PREFIX_LENGTH:
+            ranked = [normalized for _, normalized in self._top.get(prefix, [])[:limit]]
+        else:
+            keys = self._keys.irange((prefix, ""), (prefix + "\U0010ffff", ""))
+            matches = dict.fromkeys(normalized for _, normalized in keys)
+            ranked = heapq.nsmallest(limit, matches, key=lambda normalized: (-self._names[normalized][1], normalized))
+        return [self._names[normalized][0] for normalized in ranked]
+
+    @classmethod
+    def build(cls, counts: Iterable[tuple[str, int]]) -> "PrefixIndex":
+        index = cls()
+        index._keys = SortedList(key for name, count in counts for key in index._new_keys(name, count))  # one sort
+        return index
+
+
+class Autocomplete:
+    """
+    Per worker prefix indexes of the distinct authors and publishers. They are rebuilt every AUTOCOMPLETE_FULL_REFRESH_SECONDS
+    and extended in between from the books whose updated_at moved past the watermark. Names whose last book was deleted or
+    renamed stay suggestible until the next rebuild.
+    """
+
+    def __init__(self):
+        self.indexes: dict[str, PrefixIndex] = {field: PrefixIndex() for field in FIELDS}
+        self.watermark: datetime | None = None
+        self.built_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.watermark is not None
+
+    def search(self, field: Field, prefix: str, limit: int) -> list[str]:
+        return self.indexes[field].search(prefix, limit)
+
+    async def refresh(self):
+        """
+        Queries run in a thread, the indexes are only changed on the event loop, where they are searched.
+        :return:
+        """
+        settings = get_settings()
+        if not self.ready or time.monotonic() - self.built_at > settings.AUTOCOMPLETE_FULL_REFRESH_SECONDS:
+            indexes, watermark = await asyncio.to_thread(load_indexes)
+            self.indexes, self.watermark, self.built_at = indexes, watermark, time.monotonic()
+        else:
+            position = (self.watermark - timedelta(seconds=settings.AUTOCOMPLETE_LAG_SECONDS), 0)
+            while True:
+                rows = await asyncio.to_thread(load_changes, position)
+                for book_id, author, publisher, updated_at in rows:
+                    for field, name in (("author", author), ("publisher", publisher)):
+                        if name:
+                            self.indexes[field].add(name)
+                    self.watermark = max(self.watermark, updated_at)
+                    position = (updated_at, book_id)
+                if len(rows) < DELTA_BATCH:
+                    break
+        for field, index in self.indexes.items():
+            AUTOCOMPLETE_ENTRIES.labels(field).set(len(index))
+
+
+def load_indexes() -> tuple[dict[str, PrefixIndex], datetime]:
+    """
+    :return: fresh indexes and the newest updated_at they include
+    """
+    with read_session() as db:
+        watermark = db.scalar(select(func.max(models.Books.updated_at))) or datetime(1970, 1, 1)
+        indexes = {}
+        for field, column in COLUMNS.items():
+            counts = db.execute(select(column, func.count()).where(column.isnot(None)).group_by(column))
+            indexes[field] = PrefixIndex.build(counts)
+    return indexes, watermark
+
+
+def load_changes(position: tuple[datetime, int]) -> list[tuple[int, str | None, str | None, datetime]]:
+    """
+    Books changed after position, in (updated_at, id) order so a batch of books sharing one timestamp is paged through.
+    The first position is the watermark minus AUTOCOMPLETE_LAG_SECONDS, the overlap covers transactions that committed
+    after later ones. Served by ix_books_updated_at_id.
+    :param position: updated_at and id of the last book seen
+    :return: id, author, publisher and updated_at of at most DELTA_BATCH books
+    """
+    books = models.Books
+    with read_session() as db:
+        return list(db.execute(select(books.id, books.author, books.publisher, books.updated_at)
+                               .where(tuple_(books.updated_at, books.id) > position)
+                               .order_by(books.updated_at, books.id).limit(DELTA_BATCH)))
+
+
+def fuzzy_search(field: Field, query: str, limit: int) -> list[str]:
+    """
+    Trigram similarity search on the gin_trgm_ops index, for typos and infixes the prefix index cannot match.
+    The index scan is capped so a very common trigram cannot read the whole table.
+    :param field:
+    :param query:
+    :param limit:
+    :return: names most similar to query first
+    """
+    column = COLUMNS[field]
+    matches = select(column.label("name")).where(column.op("%")(query)).limit(CANDIDATES * 5).subquery()
+    statement = (select(matches.c.name).group_by(matches.c.name)
+                 .order_by(func.similarity(matches.c.name, query).desc(), matches.c.name).limit(limit))
+    with read_session() as db:
+        return list(db.scalars(statement))
+
+
+autocomplete = Autocomplete()
+
+
+async def suggest(field: Field, query: str, limit: int) -> list[str]:
+    """
+    Prefix matches from memory, topped up with trigram matches from the database when there are fewer than limit.
+    :param field:
+    :param query:
+    :param limit:
+    :return: suggestions
+    """
+    suggestions = autocomplete.search(field, query, limit) if autocomplete.ready else []
+    if len(suggestions) == limit or len(normalize(query)) < get_settings().AUTOCOMPLETE_FUZZY_MIN_LENGTH:
+        AUTOCOMPLETE_REQUESTS.labels("memory").inc()
+        return suggestions
+    AUTOCOMPLETE_REQUESTS.labels("trigram").inc()
+    fuzzy = await asyncio.to_thread(fuzzy_search, field, query, limit)
+    return list(dict.fromkeys(suggestions + fuzzy))[:limit]
+
+
+async def keep_autocomplete_fresh():
+    """
+    Long running task loading and refreshing the prefix indexes of this worker.
+    :return:
+    """
+    while True:
+        try:
+            await autocomplete.refresh()
+        except Exception as exc:
+            logger.warning("autocomplete refresh failed: %s", exc)
+        await asyncio.sleep(get_settings().AUTOCOMPLETE_REFRESH_SECONDS)
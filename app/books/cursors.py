@@ -0,0 +1,27 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(timestamp: datetime, book_id: int) -> str:
+    """
+    Opaque keyset cursor, the position after the book with this timestamp and id.
+    :param timestamp:
+    :param book_id:
+    :return: url safe cursor
+    """
+    raw = json.dumps([timestamp.isoformat(), book_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    :param cursor: cursor made by encode_cursor
+    :return: timestamp and id
+    :raises ValueError: for a cursor that was not made by encode_cursor
+    """
+    try:
+        timestamp, book_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), int(book_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
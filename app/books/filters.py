@@ -0,0 +1,159 @@
+from datetime import date, datetime
+from typing import Literal
+
+from fastapi import HTTPException, Query
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import ColumnElement, Integer, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Query as OrmQuery
+from starlette import status
+
+from app import models
+
+# Every sortable and filterable column has an index, a leading "-" sorts descending.
+SORT_COLUMNS = {
+    "id": models.Books.id,
+    "created_at": models.Books.created_at,
+    "page_count": models.Books.page_count,
+    "author": models.Books.author,
+    "publisher": models.Books.publisher,
+    "published_date": models.Books.published_date,
+}
+BookSort = Literal["id", "-id", "created_at", "-created_at", "page_count", "-page_count", "author", "-author", "publisher",
+                   "-publisher", "published_date", "-published_date"]
+
+# Columns with counters in book_facets.
+Facet = Literal["language", "publisher", "author"]
+FACETS: tuple[Facet, ...] = ("language", "publisher", "author")
+
+
+class BookFilter(BaseModel):
+    """
+    Validated filters and sort order of a book listing.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    author: str | None = None
+    publisher: str | None = None
+    language: str | None = None
+    page_count_min: int | None = None
+    page_count_max: int | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    published_from: date | None = None
+    published_to: date | None = None
+    sort: BookSort | None = None  # defaults to the range column when a range is given, else id
+
+    @property
+    def effective_sort(self) -> str:
+        ranges = self.range_columns()
+        return self.sort or (ranges[0] if ranges else "id")
+
+    @property
+    def sort_column(self) -> str:
+        return self.effective_sort.lstrip("-")
+
+    def range_columns(self) -> list[str]:
+        columns = []
+        if self.page_count_min is not None or self.page_count_max is not None:
+            columns.append("page_count")
+        if self.created_from is not None or self.created_to is not None:
+            columns.append("created_at")
+        if self.published_from is not None or self.published_to is not None:
+            columns.append("published_date")
+        return columns
+
+    def unindexable_reason(self) -> str | None:
+        """
+        Author and publisher are selective, their matches can be sorted in memory. Otherwise the rows have to come
+        in order from one index: a range only in the order of its own index, a language only by id on (language, id).
+        :return: why the combination would scan the table, None when an index serves it
+        """
+        if self.page_count_min is not None and self.page_count_max is not None and self.page_count_min > self.page_count_max:
+            return "page_count_min is greater than page_count_max"
+        if self.created_from is not None and self.created_to is not None and self.created_from > self.created_to:
+            return "created_from is after created_to"
+        if self.published_from is not None and self.published_to is not None and self.published_from > self.published_to:
+            return "published_from is after published_to"
+        ranges = self.range_columns()
+        if len(ranges) > 1:
+            return f"filter on one range at a time, got {' and '.join(ranges)}"
+        if self.author is not None or self.publisher is not None:
+            return None
+        if ranges and self.sort_column != ranges[0]:
+            return f"a {ranges[0]} range can only be sorted by {ranges[0]}, or combined with author or publisher"
+        if not ranges and self.language is not None and self.sort_column != "id":
+            return "a language filter can only be sorted by id, or combined with author or publisher"
+        return None
+
+    def apply(self, query: OrmQuery) -> OrmQuery:
+        """
+        :param query: query of books
+        :return: query with the predicates and the order, ties broken by id so pages are stable
+        """
+        books = models.Books
+        for column, value in ((books.author, self.author), (books.publisher, self.publisher), (books.language, self.language)):
+            if value is not None:
+                query = query.filter(column == value)
+        if self.page_count_min is not None:
+            query = query.filter(books.page_count >= self.page_count_min)
+        if self.page_count_max is not None:
+            query = query.filter(books.page_count <= self.page_count_max)
+        if self.created_from is not None:
+            query = query.filter(books.created_at >= self.created_from)
+        if self.created_to is not None:
+            query = query.filter(books.created_at < self.created_to)
+        if self.published_from is not None:
+            query = query.filter(books.published_date >= self.published_from)
+        if self.published_to is not None:
+            query = query.filter(books.published_date <= self.published_to)
+        column = SORT_COLUMNS[self.sort_column]
+        descending = self.effective_sort.startswith("-")
+        order = [column.desc() if descending else column.asc()]
+        if self.sort_column != "id":
+            order.append(books.id.desc() if descending else books.id.asc())
+        return query.order_by(*order)
+
+    def cache_key(self) -> str:
+        return self.model_dump_json(exclude_defaults=True)
+
+
+def get_book_filter(author: str | None = Query(None, max_length=255), publisher: str | None = Query(None, max_length=255),
+                    language: str | None = Query(None, max_length=16), page_count_min: int | None = Query(None, ge=0),
+                    page_count_max: int | None = Query(None, ge=0), created_from: datetime | None = Query(None),
+                    created_to: datetime | None = Query(None, description="exclusive"),
+                    published_from: date | None = Query(None), published_to: date | None = Query(None, description="inclusive"),
+                    sort: BookSort | None = Query(None)) -> BookFilter:
+    """
+    Dependency parsing the listing filters, combinations that cannot be served by an index are rejected with 400.
+    :return: filter
+    """
+    parsed = BookFilter(author=author, publisher=publisher, language=language, page_count_min=page_count_min,
+                        page_count_max=page_count_max, created_from=created_from, created_to=created_to,
+                        published_from=published_from, published_to=published_to, sort=sort)
+    reason = parsed.unindexable_reason()
+    if reason:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=reason)
+    return parsed
+
+
+class BookSelection(BaseModel):
+    """
+    Books a bulk write applies to: an id list and/or equality filters, every given criterion must match.
+    """
+    ids: list[int] | None = Field(None, min_length=1)
+    author: str | None = None
+    publisher: str | None = None
+    language: str | None = None
+
+    def is_empty(self) -> bool:
+        return self.ids is None and self.author is None and self.publisher is None and self.language is None
+
+    def clauses(self) -> list[ColumnElement[bool]]:
+        books = models.Books
+        clauses = [column == value for column, value in
+                   ((books.author, self.author), (books.publisher, self.publisher), (books.language, self.language))
+                   if value is not None]
+        if self.ids is not None:
+            clauses.append(books.id == any_(bindparam("selected_ids", self.ids, type_=ARRAY(Integer))))
+        return clauses
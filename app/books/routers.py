@@ -1,12 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
 from starlette import status
 
 from app import books, models
 from app.auth import auth, schemas
 from app.auth.dependencies import RoleChecker
-from app.books.schemas import BooksResponse, BooksUpdate
+from app.books import service
+from app.books.filters import FACETS, BookFilter, BookSelection, Facet, get_book_filter
+from app.books.autocomplete import Field, suggest
+from app.books.schemas import (AutocompleteResponse, BookChanges, BookFacets, BooksBatch, BooksBulkDelete,
+                               BooksBulkUpdate, BooksPage, BooksResponse, BooksUpdate, BulkWriteResult)
+from app.books.stream import events, hub
 from app.db_connection import get_db
+from app.replicas import get_read_db
+from config import get_settings
 
 books_router = APIRouter(
     tags=['Books']
@@ -24,29 +33,34 @@ async def create_book(book: books.schemas.BooksCreate, db: Session = Depends(get
     :param current_user:
     :return: new_book
     """
-    new_book = models.Books(**book.__dict__, user_id=current_user.id)
-    db.add(new_book)
-    db.commit()
-    db.refresh(new_book)
-    return new_book
+    return await run_in_threadpool(service.create_book, db, book.model_dump(), current_user.id)
 
 
 @books_router.get('/get_books/', status_code=200, response_model=list[BooksResponse])
-async def get_all_books(db: Session = Depends(get_db), current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+async def get_all_books(response: Response, skip: int = Query(0, ge=0), limit: int | None = Query(None, ge=1, le=1000),
+                        book_filter: BookFilter = Depends(get_book_filter),
+                        current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
     """
-    Current Active users can see all books.
-    :param db:
+    Current Active users can see all books, or one page at a time with limit, filtered and sorted on indexed columns.
+    Pages may be a few seconds stale, they are revalidated in the background. The unbounded listing is not cached.
+    :param response:
+    :param skip: books to skip
+    :param limit: page size, all books when not given
+    :param book_filter: filters and sort order, combinations needing a table scan are rejected with 400
     :param current_user:
     :return: all_books
     """
-    all_books = db.query(models.Books).options(joinedload(models.Books.user)).all()
+    all_books = await service.get_books_page(skip, limit, book_filter)
+    if limit is not None:  # only pages are cached
+        response.headers["Cache-Control"] = service.book_list_cache_control()
     if not all_books:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No books found.')
     return all_books
 
 
 @books_router.get('/get_single_book/{book_id}/', status_code=status.HTTP_200_OK, response_model=BooksResponse)
-def get_single_book(book_id: int, db: Session = Depends(get_db), current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+async def get_single_book(book_id: int, db: Session = Depends(get_read_db),
+                          current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
     """
     Current Active users can see a single book.
     :param book_id:
@@ -54,14 +68,131 @@ def get_single_book(book_id: int, db: Session = Depends(get_db), current_user: a
     :param current_user:
     :return: single_book
     """
-    book = db.query(models.Books).options(joinedload(models.Books.user)).filter(models.Books.id == book_id).first()
+    book = await service.get_book(db, book_id)
     if not book:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Book with id {book_id} not found")
     return book
 
 
+@books_router.get('/batch/', status_code=status.HTTP_200_OK, response_model=BooksBatch)
+async def get_books_batch(ids: list[int] = Query(..., min_length=1), db: Session = Depends(get_read_db),
+                          current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+    """
+    Current Active users can fetch many books in one request, ?ids=1&ids=2, instead of one request per book.
+    :param ids: at most BOOK_BATCH_MAX_IDS book ids
+    :param db:
+    :param current_user:
+    :return: books in the order of ids and the ids that were not found
+    """
+    max_ids = get_settings().BOOK_BATCH_MAX_IDS
+    if len(ids) > max_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {max_ids} ids per request")
+    return await service.get_books_batch(db, ids)
+
+
+@books_router.get('/autocomplete/', status_code=status.HTTP_200_OK, response_model=AutocompleteResponse)
+async def autocomplete(field: Field, q: str = Query(..., min_length=1, max_length=100), limit: int = Query(10, ge=1, le=50),
+                       current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+    """
+    Type-ahead for authors and publishers, served from the in-memory prefix index of the worker
+    with a trigram search as the fallback for typos.
+    :param field: author or publisher
+    :param q: what the user typed so far
+    :param limit:
+    :param current_user:
+    :return: suggestions
+    """
+    return AutocompleteResponse(field=field, suggestions=await suggest(field, q, limit))
+
+
+@books_router.get('/changes/', status_code=status.HTTP_200_OK, response_model=BookChanges)
+def get_changes(since: str | None = Query(None), limit: int = Query(500, ge=1, le=1000), db: Session = Depends(get_read_db),
+                current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+    """
+    Change feed for mirrors and indexers: books created or updated and tombstones of deleted books since a cursor.
+    A sync starts without since and continues with next_cursor, it only downloads what changed.
+    :param since: next_cursor of the previous page
+    :param limit: changes per page
+    :param db:
+    :param current_user:
+    :return: page of changes, oldest first
+    """
+    try:
+        return service.load_changes(db, since, limit)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+@books_router.get('/stream/', status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+async def stream_changes(current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+    """
+    Live server-sent events of book writes instead of polling: insert, update and delete events with the ids
+    of the books. A reset event means events were missed, catch up through /changes/ and reconnect.
+    :param current_user:
+    :return: event stream
+    """
+    if hub.full():
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Too many stream clients, retry later")
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@books_router.get('/facets/', status_code=status.HTTP_200_OK, response_model=BookFacets)
+def get_facets(facet: list[Facet] = Query(list(FACETS)), limit: int = Query(20, ge=1, le=500),
+               db: Session = Depends(get_read_db), current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+    """
+    Number of books per language, publisher and author for dashboards, from counters kept up to date by every write.
+    :param facet: facets to return, all by default
+    :param limit: values per facet, most books first
+    :param db:
+    :param current_user:
+    :return: counts per facet
+    """
+    return service.load_facets(db, dict.fromkeys(facet), limit)
+
+
+@books_router.get('/mine/', status_code=status.HTTP_200_OK, response_model=BooksPage)
+def get_my_books(limit: int = Query(50, ge=1, le=500), cursor: str | None = Query(None), db: Session = Depends(get_read_db),
+                 current_user: auth.schemas.User = Depends(auth.get_current_active_user)):
+    """
+    The current user's books, newest first.
+    :param limit: page size
+    :param cursor: next_cursor of the previous page
+    :param db:
+    :param current_user:
+    :return: page with the user's total book count
+    """
+    return user_books_page(db, current_user.id, limit, cursor)
+
+
+@books_router.get('/users/{user_id}/books/', status_code=status.HTTP_200_OK, response_model=BooksPage)
+def get_user_books(user_id: int, limit: int = Query(50, ge=1, le=500), cursor: str | None = Query(None),
+                   db: Session = Depends(get_read_db), current_user: auth.schemas.User = Depends(auth.get_current_admin_user)):
+    """
+    Admin users can list the books of any user, newest first.
+    :param user_id:
+    :param limit: page size
+    :param cursor: next_cursor of the previous page
+    :param db:
+    :param current_user:
+    :return: page with the user's total book count
+    """
+    return user_books_page(db, user_id, limit, cursor)
+
+
+def user_books_page(db: Session, user_id: int, limit: int, cursor: str | None) -> BooksPage:
+    try:
+        page = service.load_user_books_page(db, user_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if page is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with id {user_id} not found")
+    return page
+
+
 @books_router.patch('/update_book/{book_id}/', status_code=status.HTTP_200_OK, response_model=BooksResponse)
-async def update_book(book_id: int, book_update: BooksUpdate, db: Session = Depends(get_db), current_user: auth.schemas.User = Depends(auth.get_current_admin_user)):
+async def update_book(book_id: int, book_update: BooksUpdate, db: Session = Depends(get_db),
+                      current_user: auth.schemas.User = Depends(auth.get_current_admin_user)):
     """
     Admin users can update books.
     :param book_id:
@@ -78,6 +209,7 @@ async def update_book(book_id: int, book_update: BooksUpdate, db: Session = Depe
         setattr(book, key, value)
     db.commit()
     db.refresh(book)
+    await service.invalidate_books(book_id)
     return book
 
 
@@ -96,4 +228,45 @@ async def delete_book(book_id: int, db: Session = Depends(get_db), current_user:
     else:
         db.delete(book)
         db.commit()
+        await service.invalidate_books(book_id)
     return {"message": "Book deleted successfully"}
+
+
+@books_router.patch('/bulk_update_books/', status_code=status.HTTP_200_OK, response_model=BulkWriteResult)
+async def bulk_update_books(bulk_update: BooksBulkUpdate, db: Session = Depends(get_db),
+                            current_user: auth.schemas.User = Depends(auth.get_current_admin_user)):
+    """
+    Admin users can patch every book matching an id list and/or filters at once, e.g. fix a publisher name.
+    The books are written in chunks, each in its own short transaction.
+    :param bulk_update: selection and the fields to set
+    :param db:
+    :param current_user:
+    :return: ids of the updated books
+    """
+    values = bulk_update.patch.model_dump(exclude_unset=True)
+    if not values:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to update")
+    check_selection(bulk_update.where)
+    return await service.bulk_update_books(db, bulk_update.where, values)
+
+
+@books_router.post('/bulk_delete_books/', status_code=status.HTTP_200_OK, response_model=BulkWriteResult)
+async def bulk_delete_books(bulk_delete: BooksBulkDelete, db: Session = Depends(get_db),
+                            current_user: auth.schemas.User = Depends(auth.get_current_admin_user)):
+    """
+    Admin users can delete every book matching an id list and/or filters at once, in chunks like bulk updates.
+    :param bulk_delete: selection
+    :param db:
+    :param current_user:
+    :return: ids of the deleted books
+    """
+    check_selection(bulk_delete.where)
+    return await service.bulk_delete_books(db, bulk_delete.where)
+
+
+def check_selection(selection: BookSelection):
+    if selection.is_empty():
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Select books by ids or filters")
+    max_ids = get_settings().BULK_WRITE_MAX_IDS
+    if selection.ids is not None and len(selection.ids) > max_ids:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {max_ids} ids per request")
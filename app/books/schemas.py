@@ -3,12 +3,17 @@ from typing import Optional
 
 from pydantic import BaseModel
 
+from app.books.filters import BookSelection
+
 
 class UserBase(BaseModel):
     id: int
     username: str
     email: str
 
+    class Config:
+        from_attributes = True
+
 
 class BooksCreate(BaseModel):
     title: str
@@ -24,7 +29,7 @@ class BooksResponse(BaseModel):
     title: str
     author: str
     publisher: str
-    published_date: str
+    published_date: date | None  # serialized as YYYY-MM-DD like the former string column
     page_count: int
     language: str
     created_at: datetime
@@ -39,6 +44,46 @@ class BooksResponse(BaseModel):
         from_attributes = True
 
 
+class BooksPage(BaseModel):
+    items: list[BooksResponse]
+    total: int
+    next_cursor: str | None = None  # pass as cursor for the next page, None on the last page
+
+
+class BooksBatch(BaseModel):
+    items: list[BooksResponse]  # in the order of the requested ids
+    missing: list[int]
+
+
+class BookChange(BaseModel):
+    id: int
+    changed_at: datetime
+    deleted: bool = False
+    book: BooksResponse | None = None  # None for a deleted book
+
+
+class BookChanges(BaseModel):
+    changes: list[BookChange]
+    next_cursor: str | None = None  # pass as since to continue, None when nothing changed since the start
+    has_more: bool  # false once caught up, poll again later with next_cursor
+
+
+class AutocompleteResponse(BaseModel):
+    field: str
+    suggestions: list[str]
+
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+
+class BookFacets(BaseModel):
+    language: list[FacetCount] = []
+    publisher: list[FacetCount] = []
+    author: list[FacetCount] = []
+
+
 class BooksUpdate(BaseModel):
     title: Optional[str] = None
     author: Optional[str] = None
@@ -51,6 +96,20 @@ class BooksUpdate(BaseModel):
         from_attributes = True
 
 
+class BooksBulkUpdate(BaseModel):
+    where: BookSelection
+    patch: BooksUpdate
+
+
+class BooksBulkDelete(BaseModel):
+    where: BookSelection
+
+
+class BulkWriteResult(BaseModel):
+    count: int
+    ids: list[int]  # ids of the books written, in ascending order
+
+
 class BookUpdateResponse(BaseModel):
     id: int
     title: str | None = None
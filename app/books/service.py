@@ -0,0 +1,368 @@
+import heapq
+import logging
+from datetime import timedelta
+from itertools import islice
+from typing import Callable, Iterable
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+from sqlalchemy import TIMESTAMP, Executable, Integer, any_, bindparam, cast, delete, func, insert, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import Session, joinedload
+
+from app import models
+from app.books.cursors import decode_cursor, encode_cursor
+from app.books.filters import BookFilter, BookSelection
+from app.books.schemas import (BookChange, BookChanges, BookFacets, BooksBatch, BooksPage, BooksResponse, BulkWriteResult,
+                               FacetCount)
+from app.cache import StaleWhileRevalidateCache, TwoTierCache
+from app.redis_pool import get_redis, redis_breaker
+from app.prepared import BOOK_BY_ID, run_prepared
+from app.replicas import pinned_to_primary, read_session
+from app.singleflight import RedisSingleFlight, SingleFlight
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+BOOK_ADAPTER = TypeAdapter(BooksResponse | None)
+BOOK_LIST_ADAPTER = TypeAdapter(list[BooksResponse])
+
+book_flight = SingleFlight()
+book_cache = TwoTierCache("books", TypeAdapter(BooksResponse))
+# List pages are not invalidated on writes, they are at most BOOK_LIST_TTL_SECONDS + BOOK_LIST_STALE_SECONDS old.
+book_page_cache = StaleWhileRevalidateCache("book_pages", list[BooksResponse], lambda: get_settings().BOOK_LIST_TTL_SECONDS,
+                                            lambda: get_settings().BOOK_LIST_STALE_SECONDS)
+
+
+def load_book(db: Session, book_id: int) -> BooksResponse | None:
+    """
+    Book with its user, converted to the response model so it can be shared between requests.
+    :param db:
+    :param book_id:
+    :return: book or None
+    """
+    if get_settings().PREPARED_STATEMENTS_ENABLED:
+        row = run_prepared(db, BOOK_BY_ID, lambda statement: db.execute(statement, {"p1": book_id}).mappings().first())
+        return book_from_row(row) if row else None
+    book = db.query(models.Books).options(joinedload(models.Books.user)).filter(models.Books.id == book_id).first()
+    return BooksResponse.model_validate(book) if book else None
+
+
+def load_book_in_session(book_id: int) -> BooksResponse | None:
+    """
+    Same as load_book with its own session. Cached and coalesced loads are shared by requests and may outlive
+    the one that started them, so they must not use a request's session.
+    """
+    with read_session() as db:
+        return load_book(db, book_id)
+
+
+def create_book(db: Session, values: dict, user_id: int) -> BooksResponse:
+    """
+    Inserts the book and reads it back with its user in one statement, the INSERT ... RETURNING is a CTE
+    joined to users. Commits, the response is built from the returned row without another query.
+    :param db:
+    :param values: columns of the book
+    :param user_id: owner
+    :return: new book
+    """
+    books, users = models.Books.__table__, models.User.__table__
+    new_book = insert(books).values(**values, user_id=user_id).returning(*books.c).cte("new_book")
+    statement = select(*(column for column in new_book.c if column.name != "user_id"), users.c.id.label("user_id"),
+                       users.c.username.label("user_username"), users.c.email.label("user_email")) \
+        .select_from(new_book.outerjoin(users, users.c.id == new_book.c.user_id))
+    row = db.execute(statement).mappings().one()
+    db.commit()
+    return book_from_row(row)
+
+
+def load_books(db: Session, book_ids: list[int]) -> dict[int, BooksResponse]:
+    """
+    Many books with their users in one query, the ids are bound as one array so the statement is the same for any count.
+    :param db:
+    :param book_ids:
+    :return: books by id, missing ids are left out
+    """
+    books = models.Books
+    rows = db.query(books).options(joinedload(books.user)) \
+        .filter(books.id == any_(bindparam("book_ids", book_ids, type_=ARRAY(Integer)))).all()
+    return {book.id: BooksResponse.model_validate(book) for book in rows}
+
+
+def book_from_row(row) -> BooksResponse:
+    """
+    :param row: mapping of a BOOK_BY_ID row, the user's columns are prefixed with user_
+    :return: book
+    """
+    fields = {key: value for key, value in row.items() if not key.startswith("user_")}
+    user = {"id": row["user_id"], "username": row["user_username"], "email": row["user_email"]} if row["user_id"] is not None else None
+    return BooksResponse.model_validate(dict(fields, user=user))
+
+
+def load_books_page(db: Session, skip: int, limit: int | None, book_filter: BookFilter = BookFilter()) -> list[BooksResponse]:
+    """
+    One page of the books matching book_filter, in its order.
+    :param db:
+    :param skip:
+    :param limit: None for every book after skip
+    :param book_filter:
+    :return: books
+    """
+    query = book_filter.apply(db.query(models.Books).options(joinedload(models.Books.user)))
+    books = query.offset(skip).limit(limit).all()
+    return [BooksResponse.model_validate(book) for book in books]
+
+
+def load_books_page_in_session(skip: int, limit: int | None, book_filter: BookFilter = BookFilter()) -> list[BooksResponse]:
+    """
+    Same as load_books_page with its own session, pages are also rebuilt in the background after the request finished.
+    Pages are shared by every client and may be stale anyway, so they are read from a replica.
+    """
+    with read_session() as db:
+        return load_books_page(db, skip, limit, book_filter)
+
+
+def load_user_books_page(db: Session, user_id: int, limit: int, cursor: str | None = None) -> BooksPage | None:
+    """
+    A user's books, newest first, paginated by keyset on (created_at, id) so every page is a range of
+    ix_books_user_id_created_at_id however deep it is.
+    :param db:
+    :param user_id:
+    :param limit:
+    :param cursor: next_cursor of the previous page
+    :return: page or None when the user does not exist
+    :raises ValueError: for an invalid cursor
+    """
+    position = decode_cursor(cursor) if cursor else None
+    total = db.scalar(select(models.User.book_count).where(models.User.id == user_id))
+    if total is None:
+        return None
+    books = models.Books
+    query = db.query(books).options(joinedload(books.user)).filter(books.user_id == user_id)
+    if position:
+        query = query.filter(tuple_(books.created_at, books.id) < position)
+    rows = query.order_by(books.created_at.desc(), books.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return BooksPage(items=[BooksResponse.model_validate(book) for book in rows[:limit]], total=total, next_cursor=next_cursor)
+
+
+def load_changes(db: Session, since: str | None, limit: int) -> BookChanges:
+    """
+    Books created, updated or deleted after since, in (changed_at, id) order. Books are read on ix_books_updated_at_id
+    and tombstones on ix_book_tombstones_deleted_at_book_id, each a keyset range, merged here.
+    Timestamps are taken when a transaction starts, so the feed stops CHANGE_FEED_LAG_SECONDS before the last
+    replayed commit, a change still committing then cannot appear behind a cursor already handed out.
+    :param db:
+    :param since: next_cursor of the previous page, None to start from the beginning
+    :param limit: changes per page
+    :return: page of changes
+    :raises ValueError: for an invalid cursor
+    """
+    position = decode_cursor(since) if since else None
+    lag = timedelta(seconds=get_settings().CHANGE_FEED_LAG_SECONDS)
+    horizon = db.scalar(select(cast(func.least(func.now(), func.coalesce(func.pg_last_xact_replay_timestamp(), func.now())) - lag,
+                                    TIMESTAMP)))
+    books, tombstones = models.Books, models.BookTombstone
+    updated = db.query(books).options(joinedload(books.user)).filter(books.updated_at < horizon)
+    deleted = db.query(tombstones).filter(tombstones.deleted_at < horizon)
+    if position:
+        updated = updated.filter(tuple_(books.updated_at, books.id) > position)
+        deleted = deleted.filter(tuple_(tombstones.deleted_at, tombstones.book_id) > position)
+    updated = updated.order_by(books.updated_at, books.id).limit(limit + 1).all()
+    deleted = deleted.order_by(tombstones.deleted_at, tombstones.book_id).limit(limit + 1).all()
+    changes = heapq.merge(
+        (BookChange(id=book.id, changed_at=book.updated_at, book=BooksResponse.model_validate(book)) for book in updated),
+        (BookChange(id=tombstone.book_id, changed_at=tombstone.deleted_at, deleted=True) for tombstone in deleted),
+        key=lambda change: (change.changed_at, change.id))
+    page = list(islice(changes, limit + 1))
+    has_more = len(page) > limit
+    page = page[:limit]
+    next_cursor = encode_cursor(page[-1].changed_at, page[-1].id) if page else since
+    return BookChanges(changes=page, next_cursor=next_cursor, has_more=has_more)
+
+
+def load_facets(db: Session, facets: Iterable[str], limit: int) -> BookFacets:
+    """
+    Most common values of each facet, read from the counters in book_facets. Every facet is a range
+    of ix_book_facets_facet_count_value, the cost depends on limit and not on the number of books.
+    :param db:
+    :param facets: language, publisher and/or author
+    :param limit: values per facet
+    :return: counts, most books first
+    """
+    book_facets = models.BookFacet
+    counts = {}
+    for facet in facets:
+        rows = db.execute(select(book_facets.value, book_facets.count)
+                          .where(book_facets.facet == facet, book_facets.count > 0)
+                          .order_by(book_facets.count.desc(), book_facets.value).limit(limit))
+        counts[facet] = [FacetCount(value=value, count=count) for value, count in rows]
+    return BookFacets(**counts)
+
+
+def write_chunk(db: Session, selection: BookSelection, after: int, statement: Callable[[list[int]], Executable]) \
+        -> tuple[list[int], int | None]:
+    """
+    One transaction of a bulk write: the next BULK_WRITE_CHUNK_SIZE selected ids by primary key, then one set based
+    statement on them. The statement repeats the selection, a row changed concurrently since is rechecked and skipped.
+    :param db:
+    :param selection:
+    :param after: last id of the previous chunk
+    :param statement: UPDATE or DELETE of the chunk's ids returning the ids written
+    :return: ids written and the last id of the chunk, None once no ids are left
+    """
+    books = models.Books
+    chunk = list(db.scalars(select(books.id).where(*selection.clauses(), books.id > after).order_by(books.id)
+                            .limit(get_settings().BULK_WRITE_CHUNK_SIZE)))
+    if not chunk:
+        return [], None
+    written = sorted(db.scalars(statement(chunk)))
+    db.commit()
+    return written, chunk[-1]
+
+
+async def bulk_write(db: Session, selection: BookSelection, statement: Callable[[list[int]], Executable]) -> BulkWriteResult:
+    """
+    Applies statement chunk by chunk, each chunk commits on its own so no row stays locked for the whole write,
+    the written books are evicted from the caches after every chunk. Facets, book counts, tombstones and change
+    notifications follow through the statement level triggers on books.
+    A failure stops the write, the chunks committed before stay written.
+    :param db:
+    :param selection:
+    :param statement: UPDATE or DELETE of a chunk's ids returning the ids written
+    :return: all ids written
+    """
+    written, after = [], 0
+    while True:
+        chunk, after = await run_in_threadpool(write_chunk, db, selection, after, statement)
+        if after is None:
+            return BulkWriteResult(count=len(written), ids=written)
+        if chunk:
+            await invalidate_books(*chunk)
+            written += chunk
+
+
+async def bulk_update_books(db: Session, selection: BookSelection, values: dict) -> BulkWriteResult:
+    """
+    :param db:
+    :param selection:
+    :param values: columns to set, updated_at is set by its onupdate default
+    :return: ids updated
+    """
+    books = models.Books.__table__
+
+    def statement(chunk: list[int]) -> Executable:
+        chunk_ids = bindparam("chunk_ids", chunk, type_=ARRAY(Integer))
+        return update(books).where(books.c.id == any_(chunk_ids), *selection.clauses()).values(**values).returning(books.c.id)
+
+    return await bulk_write(db, selection, statement)
+
+
+async def bulk_delete_books(db: Session, selection: BookSelection) -> BulkWriteResult:
+    """
+    :param db:
+    :param selection:
+    :return: ids deleted
+    """
+    books = models.Books.__table__
+
+    def statement(chunk: list[int]) -> Executable:
+        chunk_ids = bindparam("chunk_ids", chunk, type_=ARRAY(Integer))
+        return delete(books).where(books.c.id == any_(chunk_ids), *selection.clauses()).returning(books.c.id)
+
+    return await bulk_write(db, selection, statement)
+
+
+async def coalesce(key: str, fetch, adapter: TypeAdapter):
+    """
+    Concurrent identical reads share one fetch, within the worker and, when SINGLEFLIGHT_DISTRIBUTED is set, across workers.
+    Without redis the read is only coalesced within the worker.
+    :param key:
+    :param fetch: coroutine function producing the value
+    :param adapter: serializes the value for the cross worker variant
+    :return: value
+    """
+    settings = get_settings()
+    if not settings.SINGLEFLIGHT_DISTRIBUTED or redis_breaker().is_open:
+        return await book_flight.do(key, fetch)
+
+    distributed = RedisSingleFlight(get_redis(), lock_ms=settings.SINGLEFLIGHT_LOCK_MS, wait_s=settings.SINGLEFLIGHT_WAIT_SECONDS)
+
+    async def fetch_across_workers():
+        try:
+            return await distributed.do(key, fetch, lambda value: adapter.dump_json(value).decode(), adapter.validate_json)
+        except RedisError as exc:
+            logger.warning("cross worker single-flight of %s failed, fetching directly: %s", key, exc)
+            return await fetch()
+
+    return await book_flight.do(key, fetch_across_workers)
+
+
+async def get_book(db: Session, book_id: int) -> BooksResponse | None:
+    """
+    :param db: only read from when the client is pinned to the primary, shared loads use their own session
+    :param book_id:
+    :return: book or None
+    """
+    if pinned_to_primary(db):
+        return await run_in_threadpool(load_book, db, book_id)
+    return await book_cache.get_or_load(
+        str(book_id), lambda: coalesce(f"book:{book_id}", lambda: run_in_threadpool(load_book_in_session, book_id), BOOK_ADAPTER))
+
+
+async def get_books_batch(db: Session, book_ids: list[int]) -> BooksBatch:
+    """
+    Cached books from one multi-get, the others from one query and cached for the next batch.
+    :param db:
+    :param book_ids:
+    :return: books in the order of book_ids, duplicates once, and the ids that do not exist
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    cache_enabled = get_settings().CACHE_ENABLED and not pinned_to_primary(db)
+    cached = await book_cache.get_many([str(book_id) for book_id in book_ids]) if cache_enabled else {}
+    found = {int(key): book for key, book in cached.items()}
+    misses = [book_id for book_id in book_ids if book_id not in found]
+    if misses:
+        generation = book_cache.generation
+        loaded = await run_in_threadpool(load_books, db, misses)
+        found.update(loaded)
+        if cache_enabled and generation == book_cache.generation:
+            await book_cache.set_many({str(book_id): book for book_id, book in loaded.items()})
+    return BooksBatch(items=[found[book_id] for book_id in book_ids if book_id in found],
+                      missing=[book_id for book_id in book_ids if book_id not in found])
+
+
+async def get_books_page(skip: int, limit: int | None, book_filter: BookFilter = BookFilter()) -> list[BooksResponse]:
+    """
+    Pages are cached and shared, the unbounded listing is read on every call, caching it would copy the whole
+    catalogue into redis and every worker and rebuild it after each write.
+    :param skip:
+    :param limit: None for every book after skip
+    :param book_filter:
+    :return: books
+    """
+    if limit is None:
+        return await run_in_threadpool(load_books_page_in_session, skip, None, book_filter)
+    key = f"{skip}:{limit}:{book_filter.cache_key()}"
+    return await book_page_cache.get_or_revalidate(
+        key, lambda: coalesce(f"books:{key}", lambda: run_in_threadpool(load_books_page_in_session, skip, limit, book_filter),
+                              BOOK_LIST_ADAPTER))
+
+
+def book_list_cache_control() -> str:
+    """
+    Cache-Control matching the server side freshness of list pages.
+    :return: header value
+    """
+    settings = get_settings()
+    return f"max-age={settings.BOOK_LIST_TTL_SECONDS}, stale-while-revalidate={settings.BOOK_LIST_STALE_SECONDS}"
+
+
+async def invalidate_books(*book_ids: int):
+    """
+    Evict books from the cache of every worker after they changed.
+    :param book_ids:
+    :return:
+    """
+    await book_cache.invalidate(*(str(book_id) for book_id in book_ids))
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import logging
+from typing import AsyncIterator
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from app.db_connection import database_url
+from app.metrics import CHANGE_STREAM_DROPPED, CHANGE_STREAM_EVENTS, CHANGE_STREAM_SUBSCRIBERS
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Notified by the triggers on books with {"op": "insert" | "update" | "delete", "ids": [...]}.
+CHANNEL = "book_changes"
+# Sent when events may have been missed, the client catches up through /books/changes/ and reconnects.
+RESET = b"event: reset\ndata: {}\n\n"
+HEARTBEAT = b": ping\n\n"
+
+
+class Subscription:
+    """
+    Bounded buffer of the encoded events of one client.
+    """
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize)
+
+    def reset(self):
+        """
+        Replaces whatever is buffered by RESET, it ends the stream once the client reads it.
+        :return:
+        """
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(RESET)
+
+
+class ChangeHub:
+    """
+    Fans the notifications of the worker's LISTEN connection out to its subscribers. An event is encoded once and
+    shared by every buffer. A client whose buffer is full is too slow to keep up, instead of blocking the others or
+    growing memory it is dropped with a RESET.
+    """
+
+    def __init__(self):
+        self.subscribers: set[Subscription] = set()
+
+    def full(self) -> bool:
+        return len(self.subscribers) >= get_settings().CHANGE_STREAM_MAX_SUBSCRIBERS
+
+    def subscribe(self) -> Subscription | None:
+        """
+        :return: subscription or None when the worker has CHANGE_STREAM_MAX_SUBSCRIBERS already
+        """
+        if self.full():
+            return None
+        subscription = Subscription(get_settings().CHANGE_STREAM_BUFFER)
+        self.subscribers.add(subscription)
+        CHANGE_STREAM_SUBSCRIBERS.set(len(self.subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+        CHANGE_STREAM_SUBSCRIBERS.set(len(self.subscribers))
+
+    def publish(self, payload: str):
+        """
+        :param payload: notification payload
+        :return:
+        """
+        change = json.loads(payload)
+        event = f"event: {change['op']}\ndata: {json.dumps({'ids': change['ids']})}\n\n".encode()
+        CHANGE_STREAM_EVENTS.labels(change["op"]).inc()
+        for subscription in list(self.subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                CHANGE_STREAM_DROPPED.inc()
+                self.unsubscribe(subscription)
+                subscription.reset()
+
+    def reset_all(self):
+        """
+        Drops every subscriber with a RESET, after notifications may have been missed.
+        :return:
+        """
+        for subscription in list(self.subscribers):
+            self.unsubscribe(subscription)
+            subscription.reset()
+
+
+hub = ChangeHub()
+
+
+def deliver(payload: str):
+    """
+    Publishes one notification, a malformed payload is logged and skipped instead of ending the listener.
+    :param payload: notification payload
+    :return:
+    """
+    try:
+        hub.publish(payload)
+    except (ValueError, KeyError, TypeError) as exc:
+        logger.error("skipping malformed book change notification %r: %s", payload[:200], exc)
+
+
+async def events() -> AsyncIterator[bytes]:
+    """
+    Server-sent events of one client, with a comment every CHANGE_STREAM_HEARTBEAT_SECONDS so proxies keep the
+    connection open. The client is subscribed once the stream starts and unsubscribed when it ends, also when the
+    client disconnects, so a response that is never sent holds no subscription. A client that lost the race for
+    the last slot gets a RESET.
+    :return: encoded events
+    """
+    subscription = hub.subscribe()
+    if subscription is None:
+        yield RESET
+        return
+    heartbeat = get_settings().CHANGE_STREAM_HEARTBEAT_SECONDS
+    try:
+        yield HEARTBEAT
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            yield event
+            if event is RESET:
+                return
+    finally:
+        hub.unsubscribe(subscription)
+
+
+async def listen_for_book_changes():
+    """
+    Long running task holding the one LISTEN connection of this worker, outside of the pool. The connection is
+    read when its socket is readable, without a thread. Subscribers are reset whenever it is (re)established,
+    notifications may have been missed meanwhile.
+    :return:
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        connection = None
+        try:
+            connection = await asyncio.to_thread(psycopg2.connect, database_url(), keepalives=1, keepalives_idle=30,
+                                                 keepalives_interval=10, keepalives_count=3)
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            hub.reset_all()
+            readable = asyncio.Event()
+            loop.add_reader(connection.fileno(), readable.set)
+            try:
+                while True:
+                    await readable.wait()
+                    readable.clear()
+                    connection.poll()
+                    while connection.notifies:
+                        deliver(connection.notifies.pop(0).payload)
+            finally:
+                loop.remove_reader(connection.fileno())
+        except (psycopg2.Error, OSError) as exc:
+            logger.warning("book change listener disconnected: %s", exc)
+            await asyncio.sleep(1)
+        finally:
+            if connection is not None:
+                connection.close()
@@ -0,0 +1,361 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+
+from app.circuit_breaker import CircuitOpenError
+from app.metrics import CACHE_LOCAL_ENTRIES, CACHE_REQUESTS
+from app.redis_pool import get_redis, mget, mset, redis_breaker
+from app.singleflight import SingleFlight
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+# Identifies this worker on the invalidation channel, it already evicted its own copies.
+WORKER_ID = f"{os.getpid()}-{os.urandom(4).hex()}"
+# Read timeout of the invalidation subscriber, an idle channel only ends one wait and is not a disconnect.
+PUBSUB_POLL_SECONDS = 5.0
+
+
+def warn_redis_error(exc: RedisError, message: str, *args):
+    """
+    Rejections of the open redis circuit are not logged per call, the breaker logs its transitions.
+    """
+    if not isinstance(exc, CircuitOpenError):
+        logger.warning(message, *args, exc)
+
+
+class LocalCache:
+    """
+    Bounded in-process cache, least recently used entries are evicted first and every entry expires after ttl seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TwoTierCache:
+    """
+    In-process LRU tier in front of redis. Invalidations are broadcast on a redis channel so every worker evicts its local copy.
+    Redis failures degrade to the local tier and the loader.
+    """
+
+    def __init__(self, namespace: str, adapter: TypeAdapter):
+        self.namespace = namespace
+        self.adapter = adapter
+        self._local: LocalCache | None = None
+        self.counts = {"local_hit": 0, "redis_hit": 0, "miss": 0}
+        self.generation = 0  # bumped by every invalidation, a load that raced with one is not cached
+        self._flight = SingleFlight()
+        self._reinvalidations: set[asyncio.Task] = set()
+        CACHES[namespace] = self
+
+    @property
+    def local(self) -> LocalCache:
+        if self._local is None:
+            settings = get_settings()
+            self._local = LocalCache(settings.CACHE_LOCAL_MAXSIZE, settings.CACHE_LOCAL_TTL_SECONDS)
+        return self._local
+
+    def redis_key(self, key: str) -> str:
+        return f"cache:{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Any:
+        """
+        :param key:
+        :return: cached value or MISSING
+        """
+        value = self.local.get(key)
+        if value is not MISSING:
+            self._record("local_hit")
+            return value
+        try:
+            raw = await get_redis().get(self.redis_key(key))
+        except RedisError as exc:
+            warn_redis_error(exc, "cache get %s:%s failed: %s", self.namespace, key)
+            raw = None
+        if raw is None:
+            self._record("miss")
+            return MISSING
+        self._record("redis_hit")
+        value = self.adapter.validate_json(raw)
+        self._set_local(key, value)
+        return value
+
+    async def set(self, key: str, value: Any):
+        self._set_local(key, value)
+        try:
+            await get_redis().set(self.redis_key(key), self.adapter.dump_json(value), ex=get_settings().CACHE_TTL_SECONDS)
+        except RedisError as exc:
+            warn_redis_error(exc, "cache set %s:%s failed: %s", self.namespace, key)
+
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """
+        Local tier first, the rest in one MGET round trip.
+        :param keys:
+        :return: cached values by key, missing keys are left out
+        """
+        found = {}
+        for key in keys:
+            value = self.local.get(key)
+            if value is not MISSING:
+                self._record("local_hit")
+                found[key] = value
+        remaining = [key for key in keys if key not in found]
+        try:
+            raws = await mget([self.redis_key(key) for key in remaining])
+        except RedisError as exc:
+            warn_redis_error(exc, "cache mget %s failed: %s", self.namespace)
+            raws = [None] * len(remaining)
+        for key, raw in zip(remaining, raws):
+            if raw is None:
+                self._record("miss")
+                continue
+            self._record("redis_hit")
+            found[key] = self.adapter.validate_json(raw)
+            self._set_local(key, found[key])
+        return found
+
+    async def set_many(self, items: dict[str, Any]):
+        """
+        :param items: values by key, written to redis in one pipelined round trip
+        :return:
+        """
+        if not items:
+            return
+        for key, value in items.items():
+            self._set_local(key, value)
+        try:
+            await mset(((self.redis_key(key), self.adapter.dump_json(value)) for key, value in items.items()),
+                       get_settings().CACHE_TTL_SECONDS)
+        except RedisError as exc:
+            warn_redis_error(exc, "cache mset %s failed: %s", self.namespace)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Cached value, or the loader's result which is then cached. None results are not cached.
+        Concurrent misses of a key share one load.
+        :param key:
+        :param loader: coroutine function loading the value on a miss
+        :return: value
+        """
+        if not get_settings().CACHE_ENABLED:
+            return await loader()
+        value = await self.get(key)
+        if value is not MISSING:
+            return value
+        return await self._flight.do(key, lambda: self._load(key, loader))
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self.generation
+        value = await loader()
+        if value is not None and generation == self.generation:
+            await self.set(key, value)
+        return value
+
+    async def invalidate(self, *keys: str):
+        """
+        Remove keys from every tier of every worker. With read replicas the keys are removed again once replicas
+        caught up, a miss served by a lagging replica in between may have cached the old value again.
+        :param keys:
+        :return:
+        """
+        await self._invalidate(*keys)
+        delay = get_settings().READ_YOUR_WRITES_SECONDS
+        if get_settings().DATABASE_REPLICA_URLS and delay > 0:
+            task = asyncio.create_task(self._invalidate_later(delay, keys))
+            self._reinvalidations.add(task)
+            task.add_done_callback(self._reinvalidations.discard)
+
+    async def _invalidate_later(self, delay: float, keys: tuple[str, ...]):
+        await asyncio.sleep(delay)
+        await self._invalidate(*keys)
+
+    async def _invalidate(self, *keys: str):
+        self.evict_local(*keys)
+        CACHE_LOCAL_ENTRIES.labels(self.namespace).set(len(self.local))
+
+        async def delete_and_publish():
+            async with get_redis().pipeline(transaction=False) as pipe:
+                pipe.delete(*(self.redis_key(key) for key in keys))
+                pipe.publish(get_settings().CACHE_INVALIDATION_CHANNEL,
+                             json.dumps({"origin": WORKER_ID, "namespace": self.namespace, "keys": list(keys)}))
+                return await pipe.execute()
+
+        try:
+            await redis_breaker().call(delete_and_publish)
+        except RedisError as exc:
+            warn_redis_error(exc, "cache invalidation %s:%s failed: %s", self.namespace, keys)
+
+    def evict_local(self, *keys: str):
+        self.generation += 1
+        for key in keys:
+            self.local.delete(key)
+
+    def _record(self, result: str):
+        self.counts[result] += 1
+        CACHE_REQUESTS.labels(self.namespace, result).inc()
+
+    def _set_local(self, key: str, value: Any):
+        self.local.set(key, value)
+        CACHE_LOCAL_ENTRIES.labels(self.namespace).set(len(self.local))
+
+
+class StaleWhileRevalidateCache(TwoTierCache):
+    """
+    Entries stay servable for stale_seconds after they expire while one background task refreshes them,
+    so requests never wait for a rebuild unless the entry is missing or too old.
+    """
+
+    def __init__(self, namespace: str, value_type: Any, ttl_seconds: Callable[[], float], stale_seconds: Callable[[], float]):
+        super().__init__(namespace, TypeAdapter(tuple[float, value_type]))  # (fresh until, value)
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._refreshing: dict[str, asyncio.Task] = {}
+
+    async def get_or_revalidate(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        :param key:
+        :param loader: coroutine function building a fresh value, it must not depend on the request
+        :return: fresh or stale value
+        """
+        if not get_settings().CACHE_ENABLED:
+            return await loader()
+        entry = await self.get(key)
+        if entry is not MISSING:
+            fresh_until, value = entry
+            now = time.time()
+            if now < fresh_until:
+                return value
+            if now < fresh_until + self.stale_seconds():
+                self._revalidate(key, loader)
+                return value
+        return await self._flight.do(key, lambda: self._refresh(key, loader))
+
+    async def _refresh(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self.generation
+        value = await loader()
+        if generation == self.generation:
+            await self.set(key, (time.time() + self.ttl_seconds(), value))
+        return value
+
+    def _revalidate(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._revalidate_once(key, loader))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def _revalidate_once(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        """
+        Only the worker that takes the refresh lock rebuilds the entry, the others drop their local copy
+        and pick up the refreshed one from redis.
+        """
+        try:
+            lock_ms = int(max(self.ttl_seconds(), 1) * 1000)
+            if not await get_redis().set(f"{self.redis_key(key)}:refresh", WORKER_ID, nx=True, px=lock_ms):
+                self.local.delete(key)
+                return
+        except RedisError as exc:
+            warn_redis_error(exc, "cache refresh lock %s:%s failed: %s", self.namespace, key)
+        try:
+            await self._flight.do(key, lambda: self._refresh(key, loader))
+        except Exception as exc:
+            logger.error("background refresh of %s:%s failed: %s", self.namespace, key, exc)
+
+
+CACHES: dict[str, TwoTierCache] = {}
+
+
+def cache_stats() -> dict[str, dict]:
+    """
+    Hit counts and hit ratio of every namespace in this worker.
+    :return: stats per namespace
+    """
+    stats = {}
+    for namespace, cache in CACHES.items():
+        counts = cache.counts
+        total = sum(counts.values())
+        stats[namespace] = dict(counts, local_entries=len(cache.local),
+                                hit_ratio=round((counts["local_hit"] + counts["redis_hit"]) / total, 4) if total else 0.0)
+    return stats
+
+
+def apply_invalidation(message: str):
+    """
+    Evict the keys of an invalidation broadcast by another worker from the local tier.
+    :param message: json with origin, namespace and keys
+    :return:
+    """
+    payload = json.loads(message)
+    if payload.get("origin") == WORKER_ID:
+        return
+    cache = CACHES.get(payload.get("namespace"))
+    if cache is None:
+        return
+    cache.evict_local(*payload.get("keys", []))
+
+
+async def listen_for_invalidations():
+    """
+    Long running task applying the invalidations of other workers. Local tiers are cleared whenever the subscription
+    is (re)established after a disconnect, messages may have been missed meanwhile. No reconnect is attempted while the redis circuit is open.
+    :return:
+    """
+    channel = get_settings().CACHE_INVALIDATION_CHANNEL
+    while True:
+        if redis_breaker().is_open:
+            await asyncio.sleep(1)
+            continue
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(channel)
+            for cache in CACHES.values():
+                cache.generation += 1
+                cache.local.clear()
+            while True:
+                # listen() would read with the pool's short socket timeout and fail on every quiet second.
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=PUBSUB_POLL_SECONDS)
+                if message is not None and message["type"] == "message":
+                    apply_invalidation(message["data"])
+        except RedisError as exc:
+            logger.warning("cache invalidation listener disconnected: %s", exc)
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
@@ -1,7 +1,7 @@
 from asgiref.sync import async_to_sync
 from celery import Celery
 
-from app.mail import mail, send_email_async
+from app.mail import get_mail, send_email_async
 
 c_app = Celery()
 
@@ -15,5 +15,5 @@ def send_email_celery(addresses: list[str], subject: str, html_message: str):
         subject=subject,
         body=html_message,
     )
-    async_to_sync(mail.send_message)(message)
+    async_to_sync(get_mail().send_message)(message)
     print("Email Sent")
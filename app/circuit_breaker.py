@@ -0,0 +1,111 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from app.metrics import CIRCUIT_REJECTED, CIRCUIT_STATE, CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_CODES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling a dependency whose circuit is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Trips open after failure_threshold consecutive failed or slow calls, calls are then rejected immediately so callers
+    fall back instead of waiting for timeouts. After reset_seconds a single half-open probe is let through, it closes
+    the circuit on success and reopens it on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, slow_call_seconds: float, reset_seconds: float,
+                 failures: tuple[type[BaseException], ...] = (Exception,), open_error: type[Exception] = CircuitOpenError):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_seconds = reset_seconds
+        self.failures = failures
+        self.open_error = open_error
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        CIRCUIT_STATE.labels(name).set(STATE_CODES[CLOSED])
+        BREAKERS[name] = self
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Calls would be rejected right now.
+        """
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at < self.reset_seconds
+        return self.state == HALF_OPEN and self._probing
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        :param fn: coroutine function calling the dependency
+        :return: fn's result
+        :raises open_error: when the circuit is open
+        """
+        self._before_call()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except self.failures:
+            self.record_failure()
+            raise
+        except BaseException:
+            self._probing = False  # cancelled or a caller error, says nothing about the dependency
+            raise
+        if time.monotonic() - started > self.slow_call_seconds:
+            self.record_failure()
+        else:
+            self.record_success()
+        return result
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._probing = False
+        if self.state != CLOSED:
+            logger.info("circuit %s closed", self.name)
+            self._transition(CLOSED)
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            logger.warning("circuit %s opened after %s consecutive failures", self.name, self.consecutive_failures)
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def _before_call(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+            CIRCUIT_REJECTED.labels(self.name).inc()
+            raise self.open_error(f"circuit {self.name} is open")
+        if self.state == HALF_OPEN:
+            self._probing = True
+
+    def _transition(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(STATE_CODES[state])
+        CIRCUIT_TRANSITIONS.labels(self.name, state).inc()
+
+
+BREAKERS: dict[str, CircuitBreaker] = {}
+
+
+def circuit_states() -> dict[str, str]:
+    """
+    :return: state of every circuit of this worker
+    """
+    return {name: breaker.state for name, breaker in BREAKERS.items()}
@@ -5,8 +5,6 @@ from fastapi.requests import Request
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import SQLAlchemyError
 
-app = FastAPI()
-
 
 class BaseError(Exception):
     """
@@ -58,13 +56,14 @@ def register_all_errors(app: FastAPI):
 
     app.add_exception_handler(InsufficientPermission,
                               create_exception_handler(status_code=status.HTTP_403_FORBIDDEN, message={"message": "Not enough permissions"}))
+    app.add_exception_handler(500, server_error)
+    app.add_exception_handler(SQLAlchemyError, database__error)
 
 
-@app.exception_handler(500)
-async def server_error(app: FastAPI, exception):
+async def server_error(request: Request, exception: Exception) -> JSONResponse:
     """
     Internal Server Error Handler.
-    :param app:
+    :param request:
     :param exception:
     :return:
     """
@@ -74,8 +73,7 @@ async def server_error(app: FastAPI, exception):
     )
 
 
-@app.exception_handler(SQLAlchemyError)
-async def database__error(request, exc):
+async def database__error(request: Request, exc: SQLAlchemyError) -> JSONResponse:
     """
     Database error handler.
     :param request:
@@ -1,33 +1,85 @@
-import os
 from datetime import datetime, timedelta
+from functools import lru_cache
 
-import psycopg2
 from dotenv import load_dotenv
-from fastapi import BackgroundTasks, FastAPI, Request, Response
-from fastapi_redis_cache import FastApiRedisCache
-from redis import Redis
-from sqlalchemy import create_engine
+from fastapi import BackgroundTasks, Request
+from sqlalchemy import Engine, create_engine
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
 
-from app import models
 # from app.auth.auth import clean_blacklisted_tokens
-from config import settings
+from app.redis_pool import close_redis_pool, init_redis_pool
+from config import get_settings, split_budget, worker_count
 
 # from main import init_redis_cache
 
-app = FastAPI()
-
 load_dotenv()
 
-DEV_DATABASE_URL = DATABASE_URL = f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}" \
-                                  f":{settings.database_port}/{settings.database_name}"
-engine = create_engine(DEV_DATABASE_URL)
 Base = declarative_base()
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=True)  # dependency injection
-
-
-async def get_db():
-    db = SessionLocal()
+SessionLocal = sessionmaker(autocommit=False, autoflush=True)  # bound to the engine in get_session
+
+
+def database_url() -> str:
+    settings = get_settings()
+    return f"postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}" \
+           f":{settings.database_port}/{settings.database_name}"
+
+
+def db_pool_sizes() -> tuple[int, int]:
+    """
+    SQLAlchemy pool_size and max_overflow of one worker, derived from DB_CONNECTION_BUDGET.
+    Three quarters of the share stay open, the rest is overflow for bursts.
+    :return: pool_size, max_overflow
+    """
+    settings = get_settings()
+    per_worker = split_budget(settings.DB_CONNECTION_BUDGET, worker_count(settings))
+    pool_size = max(1, per_worker * 3 // 4)
+    return pool_size, per_worker - pool_size
+
+
+@lru_cache
+def get_engine() -> Engine:
+    """
+    Engine is created on first use, so importing the app does not build the connection pool.
+    :return: engine
+    """
+    pool_size, max_overflow = db_pool_sizes()
+    return create_engine(database_url(), pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+
+
+@lru_cache
+def get_replica_engines() -> tuple[Engine, ...]:
+    """
+    One engine per DATABASE_REPLICA_URLS entry, each with a pool of the same size as the primary's.
+    :return: replica engines, empty without replicas
+    """
+    pool_size, max_overflow = db_pool_sizes()
+    return tuple(create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_pre_ping=True)
+                 for url in get_settings().DATABASE_REPLICA_URLS)
+
+
+def get_session() -> Session:
+    """
+    New session bound to the lazily created engine.
+    :return: session
+    """
+    return SessionLocal(bind=get_engine())
+
+
+def request_session(request: Request) -> Session:
+    """
+    The request's session on the primary, created on first use. get_db and the reads of a write request share it,
+    so authenticating a write does not hold a second pooled connection.
+    :param request:
+    :return: session
+    """
+    db = getattr(request.state, "db", None)
+    if db is None:
+        db = request.state.db = get_session()
+    return db
+
+
+async def get_db(request: Request):
+    db = request_session(request)
     try:
         yield db
     finally:
@@ -39,33 +91,13 @@ async def get_db():
 #     db.query(models.BlacklistedToken).filter(models.BlacklistedToken.blacklisted_on < expiration_date).delete()
 #     db.commit()
 
-def init_redis_cache(app):
-    FastApiRedisCache().init(
-        host_url=REDIS_URL,
-        prefix="myapi-cache",
-        response_header="X-MyAPI-Cache",
-        ignore_arg_types=[Request, Response, Session]
-    )
-
-
-REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
-
-redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
-
-
-@app.on_event("startup")
 async def startup():
-    # FastApiRedisCache().init(
-    #     host_url=REDIS_URL,
-    #     prefix="myapi-cache",
-    #     response_header="X-MyAPI-Cache",
-    #     ignore_arg_types=[Request, Response, Session]
-    # )
-    init_redis_cache(app)
-    app.db_connection = psycopg2.connect(DEV_DATABASE_URL)
+    init_redis_pool()
 
     async def clean_tokens(days: int = 7):
-        db = SessionLocal()
+        from app import models
+
+        db = get_session()
         try:
             expiration_date = datetime.utcnow() - timedelta(days=days)
             db.query(models.BlacklistedToken).filter(models.BlacklistedToken.blacklisted_on < expiration_date).delete()
@@ -77,6 +109,10 @@ async def startup():
     background_tasks.add_task(clean_tokens)
 
 
-@app.on_event("shutdown")
 async def shutdown():
-    app.db_connection.close()
+    await close_redis_pool()
+    if get_engine.cache_info().currsize:
+        get_engine().dispose()
+    if get_replica_engines.cache_info().currsize:
+        for engine in get_replica_engines():
+            engine.dispose()
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from starlette import status
+
+from app.circuit_breaker import OPEN, circuit_states
+
+health_router = APIRouter(
+    tags=['health']
+)
+
+
+@health_router.get('/live/')
+async def liveness():
+    """
+    The process is up and serving requests.
+    :return:
+    """
+    return {"status": "alive"}
+
+
+@health_router.get('/ready/')
+async def readiness(request: Request):
+    """
+    The worker has finished warming up and can take traffic. An open circuit reports the worker as degraded but keeps
+    it in rotation, it still serves requests from its fallbacks and every worker shares the same dependencies.
+    :param request:
+    :return: 200 when ready else 503
+    """
+    circuits = circuit_states()
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "warming_up", "circuits": circuits})
+    return {"status": "degraded" if OPEN in circuits.values() else "ready", "circuits": circuits}
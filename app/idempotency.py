@@ -0,0 +1,183 @@
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
+import time
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+from jose import JWTError, jwt
+from redis.exceptions import RedisError
+from starlette import status
+
+from app.auth.auth import ALGORITHM, SECRET_KEY
+from app.cache import warn_redis_error
+from app.metrics import IDEMPOTENCY_REQUESTS
+from app.redis_pool import get_redis
+from app.replicas import client_key
+from app.singleflight import RELEASE_LOCK
+from config import get_settings
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+
+
+def fingerprint(request: Request, body: bytes) -> str:
+    """
+    :param request:
+    :param body:
+    :return: hash of everything that makes two requests the same request
+    """
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.url.path.encode(), request.url.query.encode(), body):
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+def client_scope(request: Request) -> str:
+    """
+    Authenticated clients are scoped by the user of their token, so their keys survive a token refresh, tokens that
+    do not decode by their hash. Anonymous requests, e.g. signups, are scoped by the client address: clients behind
+    one proxy or NAT share that scope and have to send unique keys, like UUIDs.
+    :param request:
+    :return: scope
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            subject = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            subject = None
+        if subject:
+            return f"user:{subject}"
+    key = client_key(request)
+    if key is not None:
+        return f"token:{key}"
+    return f"address:{request.client.host if request.client else 'unknown'}"
+
+
+def storage_key(request: Request, key: str) -> str:
+    """
+    Keys are scoped by client_scope, an authenticated client never replays another client's response.
+    """
+    scope = hashlib.sha256(f"{client_scope(request)}:{key}".encode()).hexdigest()[:32]
+    return f"idempotency:{scope}"
+
+
+def build_response(status_code: int, headers: list[tuple[str, str]], body: bytes) -> Response:
+    """
+    :param status_code:
+    :param headers: headers without content-length, repeated headers like set-cookie are kept
+    :param body:
+    :return: response
+    """
+    response = Response(content=body, status_code=status_code)
+    for name, value in headers:
+        response.headers.append(name, value)
+    return response
+
+
+def response_headers(response: Response) -> list[tuple[str, str]]:
+    return [(name, value) for name, value in response.headers.items() if name != "content-length"]
+
+
+def encode_response(request_fingerprint: str, status_code: int, headers: list[tuple[str, str]], body: bytes) -> str:
+    return json.dumps({"fingerprint": request_fingerprint, "status": status_code, "headers": headers,
+                       "body": base64.b64encode(body).decode()})
+
+
+def replay(stored: str, request_fingerprint: str) -> Response:
+    """
+    :param stored: response stored by encode_response
+    :param request_fingerprint:
+    :return: the stored response, or 422 when the key was used for a different request
+    """
+    stored = json.loads(stored)
+    if stored["fingerprint"] != request_fingerprint:
+        IDEMPOTENCY_REQUESTS.labels("mismatch").inc()
+        return JSONResponse(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            content={"message": f"{HEADER} was already used for a different request",
+                                     "error_code": "idempotency_key_reused"})
+    IDEMPOTENCY_REQUESTS.labels("replayed").inc()
+    response = build_response(stored["status"], stored["headers"], base64.b64decode(stored["body"]))
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+async def wait_for_response(result_key: str, lock_key: str, deadline: float) -> str | None:
+    """
+    :return: the response stored by the request holding the lock, None when it failed or the deadline passed
+    """
+    redis = get_redis()
+    while time.monotonic() < deadline:
+        stored = await redis.get(result_key)
+        if stored is not None:
+            return stored
+        if await redis.get(lock_key) is None:
+            return await redis.get(result_key)  # it may have stored its response just before releasing the lock
+        await asyncio.sleep(POLL_SECONDS)
+    return None
+
+
+def register_idempotency(app: FastAPI):
+    """
+    POST requests with an Idempotency-Key header are executed once per key, retries get the stored response.
+    :param app:
+    :return:
+    """
+
+    @app.middleware("http")
+    async def idempotency(request: Request, call_next):
+        key = request.headers.get(HEADER)
+        if request.method != "POST" or key is None:
+            return await call_next(request)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST,
+                                content={"message": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters",
+                                         "error_code": "invalid_idempotency_key"})
+        settings = get_settings()
+        request_fingerprint = fingerprint(request, await request.body())
+        result_key = storage_key(request, key)
+        lock_key = f"{result_key}:lock"
+        token = secrets.token_hex(8)
+        redis = get_redis()
+        try:
+            stored = await redis.get(result_key)
+            locked = stored is None and await redis.set(lock_key, token, nx=True, px=settings.IDEMPOTENCY_LOCK_MS)
+            if stored is None and not locked:
+                # A concurrent duplicate runs, wait for its response instead of executing the request twice.
+                deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+                stored = await wait_for_response(result_key, lock_key, deadline)
+                if stored is None:
+                    IDEMPOTENCY_REQUESTS.labels("conflict").inc()
+                    return JSONResponse(status_code=status.HTTP_409_CONFLICT,
+                                        content={"message": f"A request with this {HEADER} is in progress, retry later",
+                                                 "error_code": "idempotency_key_in_progress"},
+                                        headers={"Retry-After": "1"})
+        except RedisError as exc:
+            warn_redis_error(exc, "idempotency lookup failed, executing the request without it: %s")
+            IDEMPOTENCY_REQUESTS.labels("bypassed").inc()
+            return await call_next(request)
+        if stored is not None:
+            return replay(stored, request_fingerprint)
+
+        try:
+            response = await call_next(request)
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            headers = response_headers(response)
+            if response.status_code < 500:  # server errors are not stored, a retry may succeed
+                try:
+                    await redis.set(result_key, encode_response(request_fingerprint, response.status_code, headers, body),
+                                    ex=settings.IDEMPOTENCY_TTL_SECONDS)
+                    IDEMPOTENCY_REQUESTS.labels("stored").inc()
+                except RedisError as exc:
+                    warn_redis_error(exc, "storing the idempotent response failed: %s")
+            return build_response(response.status_code, headers, body)
+        finally:
+            try:
+                await redis.eval(RELEASE_LOCK, 1, lock_key, token)
+            except RedisError as exc:
+                warn_redis_error(exc, "releasing the idempotency lock failed: %s")
@@ -1,30 +1,45 @@
+from functools import lru_cache
 from pathlib import Path
 from typing import List
 
-from fastapi import FastAPI
-from fastapi_mail import ConnectionConfig, FastMail, MessageSchema, MessageType
+from config import get_settings
 
-from config import settings
+BASE_DIR = Path(__file__).resolve().parent.parent
 
-app = FastAPI()
 
-BASE_DIR = Path(__file__).resolve().parent.parent
+@lru_cache
+def get_mail_config():
+    """
+    fastapi_mail is slow to import, it is only loaded when mail is actually sent.
+    :return: mail connection config
+    """
+    from fastapi_mail import ConnectionConfig
+
+    settings = get_settings()
+    return ConnectionConfig(
+        MAIL_USERNAME=settings.MAIL_USERNAME,
+        MAIL_PASSWORD=settings.MAIL_PASSWORD,
+        MAIL_FROM=settings.MAIL_FROM,
+        MAIL_FROM_NAME=settings.MAIL_FROM_NAME,
+        MAIL_PORT=settings.MAIL_PORT,
+        MAIL_SERVER=settings.MAIL_SERVER,
+        MAIL_STARTTLS=settings.MAIL_STARTTLS,
+        MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
+        USE_CREDENTIALS=settings.USE_CREDENTIALS,
+        VALIDATE_CERTS=settings.VALIDATE_CERTS,
+        TEMPLATE_FOLDER=Path(BASE_DIR, "templates"),
+    )
+
 
-mail_config = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_FROM_NAME=settings.MAIL_FROM_NAME,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=settings.MAIL_STARTTLS,
-    MAIL_SSL_TLS=settings.MAIL_SSL_TLS,
-    USE_CREDENTIALS=settings.USE_CREDENTIALS,
-    VALIDATE_CERTS=settings.VALIDATE_CERTS,
-    TEMPLATE_FOLDER=Path(BASE_DIR, "templates"),
-)
+@lru_cache
+def get_mail():
+    """
+    Mail client is created on first use.
+    :return: FastMail instance
+    """
+    from fastapi_mail import FastMail
 
-mail = FastMail(config=mail_config)
+    return FastMail(config=get_mail_config())
 
 
 # @app.post("/email")
@@ -42,6 +57,8 @@ mail = FastMail(config=mail_config)
 # return JSONResponse(status_code=200, content={"message": "email has been sent"})
 
 async def send_email_async(addresses: List[str], subject: str, body: str):
+    from fastapi_mail import MessageSchema, MessageType
+
     message = MessageSchema(
         subject=subject,
         recipients=addresses,
@@ -49,4 +66,4 @@ async def send_email_async(addresses: List[str], subject: str, body: str):
         body=body,
         subtype=MessageType.html
     )
-    await mail.send_message(message, template_name="email_template.html")
+    await get_mail().send_message(message, template_name="email_template.html")
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+metrics_router = APIRouter(
+    tags=['metrics']
+)
+
+ADMISSION_LIMIT = Gauge("admission_concurrency_limit", "Concurrent requests allowed per route group", ["group"])
+ADMISSION_IN_FLIGHT = Gauge("admission_in_flight", "Requests executing per route group", ["group"])
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for a slot per route group", ["group"])
+ADMISSION_REJECTED = Counter("admission_rejected_total", "Requests shed with 503 per route group", ["group", "reason"])
+ADMISSION_WAIT = Histogram("admission_queue_wait_seconds", "Time spent waiting for a slot per route group", ["group"],
+                           buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups per namespace and result", ["namespace", "result"])
+CACHE_LOCAL_ENTRIES = Gauge("cache_local_entries", "Entries in the in-process cache tier per namespace", ["namespace"])
+REDIS_POOL_MAX = Gauge("redis_pool_max_connections", "Connections the redis pool of this worker may open")
+REDIS_POOL_IN_USE = Gauge("redis_pool_in_use_connections", "Redis connections checked out of the pool")
+REDIS_POOL_AVAILABLE = Gauge("redis_pool_available_connections", "Idle redis connections in the pool")
+DB_READ_SESSIONS = Counter("db_read_sessions_total", "Read-only sessions per target database", ["target"])
+DB_REPLICA_HEALTHY = Gauge("db_replica_healthy", "1 while a read replica passes its health check", ["replica"])
+AUTOCOMPLETE_ENTRIES = Gauge("autocomplete_entries", "Distinct names in the in-memory prefix index per field", ["field"])
+AUTOCOMPLETE_REQUESTS = Counter("autocomplete_requests_total", "Autocomplete requests per source of the suggestions", ["source"])
+CHANGE_STREAM_SUBSCRIBERS = Gauge("change_stream_subscribers", "Clients of the live book change stream in this worker")
+CHANGE_STREAM_EVENTS = Counter("change_stream_events_total", "Book change notifications received per operation", ["op"])
+CHANGE_STREAM_DROPPED = Counter("change_stream_dropped_total", "Stream clients dropped because their buffer was full")
+IDEMPOTENCY_REQUESTS = Counter("idempotency_requests_total", "POST requests with an Idempotency-Key per outcome", ["result"])
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Circuit state per dependency, 0 closed, 1 open, 2 half-open", ["name"])
+CIRCUIT_TRANSITIONS = Counter("circuit_breaker_transitions_total", "Circuit state changes per dependency", ["name", "state"])
+CIRCUIT_REJECTED = Counter("circuit_breaker_rejected_total", "Calls rejected by an open circuit per dependency", ["name"])
+
+
+@metrics_router.get('/metrics')
+async def metrics():
+    """
+    Prometheus metrics of this worker.
+    :return: metrics in the prometheus text format
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,7 @@
 import datetime
 import enum
 
-from sqlalchemy import TIMESTAMP, Boolean, Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy import TIMESTAMP, Boolean, Column, Date, DateTime, ForeignKey, Index, Integer, String, func
 from sqlalchemy.orm import relationship
 
 from .db_connection import Base
@@ -22,20 +22,56 @@ class Books(Base):
     __tablename__ = 'books'
     id = Column(Integer, primary_key=True)
     title = Column(String)
-    author = Column(String)
-    publisher = Column(String)
-    published_date = Column(String)
+    author = Column(String, index=True)
+    publisher = Column(String, index=True)
+    published_date = Column(Date, index=True)
     page_count = Column(Integer)
     language = Column(String)
-    created_at = Column(TIMESTAMP, default=func.now(), nullable=False)
+    created_at = Column(TIMESTAMP, default=func.now(), nullable=False, index=True)
     updated_at = Column(TIMESTAMP, default=func.now(), onupdate=func.now(), nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'))
     user = relationship("User", back_populates="books")
 
+    __table_args__ = (
+        Index('ix_books_page_count_id', 'page_count', 'id'),
+        Index('ix_books_language_id', 'language', 'id'),
+        Index('ix_books_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_books_updated_at_id', 'updated_at', 'id'),
+        Index('ix_books_author_trgm', 'author', postgresql_using='gin', postgresql_ops={'author': 'gin_trgm_ops'}),
+        Index('ix_books_publisher_trgm', 'publisher', postgresql_using='gin', postgresql_ops={'publisher': 'gin_trgm_ops'}),
+    )
+
     def __repr__(self):
         return f"{self.title} {self.author} {self.publisher} {self.published_date} {self.page_count} {self.language}"
 
 
+class BookFacet(Base):
+    """
+    Number of books per language, publisher and author, maintained by statement level triggers on books.
+    """
+    __tablename__ = 'book_facets'
+    facet = Column(String, primary_key=True)  # books column the value is from
+    value = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index('ix_book_facets_facet_count_value', 'facet', count.desc(), 'value'),
+    )
+
+
+class BookTombstone(Base):
+    """
+    Deleted book, written by a trigger on books for the change feed.
+    """
+    __tablename__ = 'book_tombstones'
+    book_id = Column(Integer, primary_key=True, autoincrement=False)  # no foreign key, the book is gone
+    deleted_at = Column(TIMESTAMP, nullable=False)
+
+    __table_args__ = (
+        Index('ix_book_tombstones_deleted_at_book_id', 'deleted_at', 'book_id'),
+    )
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -46,6 +82,7 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     is_verified = Column(Boolean, default=False)
     role = Column(String, default=UserRole.USER.value)
+    book_count = Column(Integer, nullable=False, default=0, server_default='0')  # maintained by triggers on books
     books = relationship("Books", back_populates="user")
 
 
@@ -0,0 +1,99 @@
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+from sqlalchemy import TextClause, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Names of the statements prepared on a pooled connection, kept in the connection's info dict.
+PREPARED_KEY = "prepared_statements"
+
+# Postgres errors of a prepared statement the schema or a DISCARD ALL invalidated.
+STALE_PLAN_MESSAGES = ("cached plan must not change result type", "prepared statement")
+STALE_PLAN_CODES = {"0A000", "26000"}
+
+
+@dataclass(frozen=True)
+class PreparedStatement:
+    """
+    Server-side prepared statement, sql uses $1.. placeholders and selects explicit columns
+    so added columns do not change its result type.
+    """
+    name: str
+    param_types: tuple[str, ...]
+    sql: str
+
+    @property
+    def server_name(self) -> str:
+        # Versioned by the sql, a changed statement never reuses an old plan.
+        return f"{self.name}_{hashlib.md5(self.sql.encode()).hexdigest()[:8]}"
+
+    def prepare_clause(self) -> TextClause:
+        return text(f"PREPARE {self.server_name} ({', '.join(self.param_types)}) AS {self.sql}")
+
+    def execute_clause(self) -> TextClause:
+        binds = ", ".join(f":p{index}" for index in range(1, len(self.param_types) + 1))
+        return text(f"EXECUTE {self.server_name} ({binds})")
+
+
+USER_BY_EMAIL = PreparedStatement(
+    "user_by_email", ("text",),
+    "SELECT users.id, users.username, users.email, users.hashed_password, users.is_active, users.is_verified, users.role "
+    "FROM users WHERE users.email = $1 LIMIT 1")
+TOKEN_BLACKLISTED = PreparedStatement(
+    "token_blacklisted", ("text",),
+    "SELECT 1 FROM blacklisted_tokens WHERE blacklisted_tokens.token = $1 LIMIT 1")
+BOOK_BY_ID = PreparedStatement(
+    "book_by_id", ("integer",),
+    "SELECT books.id, books.title, books.author, books.publisher, books.published_date, books.page_count, books.language, "
+    "books.created_at, books.updated_at, users.id AS user_id, users.username AS user_username, users.email AS user_email "
+    "FROM books LEFT OUTER JOIN users ON users.id = books.user_id WHERE books.id = $1")
+
+
+def is_stale_plan(exc: DBAPIError) -> bool:
+    code = getattr(exc.orig, "pgcode", None)
+    return code in STALE_PLAN_CODES and any(message in str(exc.orig) for message in STALE_PLAN_MESSAGES)
+
+
+def execute_clause(db: Session, statement: PreparedStatement) -> TextClause:
+    """
+    Prepares statement on the session's connection unless that connection already did.
+    :param db:
+    :param statement:
+    :return: EXECUTE clause taking the parameters as p1, p2, ...
+    """
+    connection = db.connection()
+    prepared = connection.info.setdefault(PREPARED_KEY, set())
+    if statement.server_name not in prepared:
+        db.execute(statement.prepare_clause())
+        prepared.add(statement.server_name)
+    return statement.execute_clause()
+
+
+def run_prepared(db: Session, statement: PreparedStatement, run: Callable[[TextClause], T]) -> T:
+    """
+    Runs run with the EXECUTE clause of statement. When a migration invalidated the plan, the connection is discarded,
+    which drops its prepared statements, and the lookup is retried on a fresh one if it started the transaction.
+    :param db:
+    :param statement:
+    :param run: executes the clause and builds the result
+    :return: run's result
+    """
+    started_transaction = not db.in_transaction()
+    try:
+        return run(execute_clause(db, statement))
+    except DBAPIError as exc:
+        if not is_stale_plan(exc):
+            raise
+        logger.warning("prepared statement %s is stale, reconnecting: %s", statement.server_name, exc.orig)
+        db.connection().invalidate()
+        db.rollback()
+        if not started_transaction:
+            raise
+    return run(execute_clause(db, statement))
@@ -0,0 +1,133 @@
+from typing import Iterable
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.metrics import REDIS_POOL_AVAILABLE, REDIS_POOL_IN_USE, REDIS_POOL_MAX
+from config import get_settings, split_budget, worker_count
+
+_pool: BlockingConnectionPool | None = None
+_client: Redis | None = None
+_breaker: CircuitBreaker | None = None
+
+
+class RedisCircuitOpen(CircuitOpenError, RedisError):
+    """
+    A RedisError, so every existing redis fallback also handles the open circuit.
+    """
+
+
+def redis_breaker() -> CircuitBreaker:
+    """
+    The circuit breaker guarding every redis call of this worker.
+    :return: breaker
+    """
+    global _breaker
+    if _breaker is None:
+        settings = get_settings()
+        _breaker = CircuitBreaker("redis", settings.REDIS_BREAKER_FAILURE_THRESHOLD, settings.REDIS_BREAKER_SLOW_CALL_SECONDS,
+                                  settings.REDIS_BREAKER_RESET_SECONDS, failures=(RedisError, OSError), open_error=RedisCircuitOpen)
+    return _breaker
+
+
+class GuardedRedis(Redis):
+    """
+    Redis client whose commands go through the circuit breaker. Pipelines and pub/sub bypass execute_command,
+    their callers use the breaker directly.
+    """
+
+    async def execute_command(self, *args, **options):
+        return await redis_breaker().call(lambda: Redis.execute_command(self, *args, **options))
+
+
+def redis_max_connections() -> int:
+    """
+    This worker's share of REDIS_CONNECTION_BUDGET.
+    :return: max connections
+    """
+    settings = get_settings()
+    return split_budget(settings.REDIS_CONNECTION_BUDGET, worker_count(settings))
+
+
+def init_redis_pool() -> Redis:
+    """
+    Creates the worker's redis connection pool, called from lifespan and on first use outside of the app.
+    Waits up to REDIS_POOL_TIMEOUT for a free connection instead of opening more than the budget.
+    :return: redis client using the pool
+    """
+    global _pool, _client
+    if _client is None:
+        settings = get_settings()
+        _pool = BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=redis_max_connections(),
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_CONNECT_TIMEOUT,
+            health_check_interval=30,
+            decode_responses=True,
+        )
+        _client = GuardedRedis(connection_pool=_pool)
+    return _client
+
+
+async def close_redis_pool():
+    global _pool, _client
+    if _pool is not None:
+        await _pool.aclose()
+    _pool = _client = None
+
+
+def get_redis() -> Redis:
+    """
+    The shared asyncio redis client, every redis consumer of the app goes through it.
+    :return: redis client
+    """
+    return _client if _client is not None else init_redis_pool()
+
+
+async def mget(keys: list[str]) -> list[str | None]:
+    """
+    Values of many keys in one round trip.
+    :param keys:
+    :return: values in the order of keys, None for missing keys
+    """
+    if not keys:
+        return []
+    return await get_redis().mget(keys)
+
+
+async def mset(items: Iterable[tuple[str, str | bytes]], ttl: int):
+    """
+    Set many keys with a ttl in one pipelined round trip.
+    :param items: key, value pairs
+    :param ttl: seconds
+    :return:
+    """
+    async def execute():
+        async with get_redis().pipeline(transaction=False) as pipe:
+            for key, value in items:
+                pipe.set(key, value, ex=ttl)
+            return await pipe.execute()
+
+    await redis_breaker().call(execute)
+
+
+def pool_stats() -> dict:
+    """
+    Connection counts of the pool of this worker.
+    :return: max, in_use and available connections
+    """
+    if _pool is None:
+        return {"max": 0, "in_use": 0, "available": 0}
+    return {
+        "max": _pool.max_connections,
+        "in_use": len(_pool._in_use_connections),
+        "available": len(_pool._available_connections),
+    }
+
+
+REDIS_POOL_MAX.set_function(lambda: pool_stats()["max"])
+REDIS_POOL_IN_USE.set_function(lambda: pool_stats()["in_use"])
+REDIS_POOL_AVAILABLE.set_function(lambda: pool_stats()["available"])
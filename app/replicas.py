@@ -0,0 +1,188 @@
+import hashlib
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from fastapi import Depends, FastAPI, Request
+from redis.exceptions import RedisError
+from sqlalchemy import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+
+from app.cache import MISSING, LocalCache
+from app.db_connection import SessionLocal, get_engine, get_replica_engines, request_session
+from app.metrics import DB_READ_SESSIONS, DB_REPLICA_HEALTHY
+from app.redis_pool import get_redis
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+PINNED = "read_your_writes"  # Session.info flag of reads pinned to the primary
+
+
+class ReplicaSet:
+    """
+    Round-robin over the replica engines. Connections are checked out eagerly, a replica whose checkout fails
+    (pool_pre_ping included) is skipped for retry_seconds and the next one is tried.
+    """
+
+    def __init__(self, engines: tuple[Engine, ...], retry_seconds: float):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._down_until = [0.0] * len(engines)
+        self._counter = itertools.count()
+        for index in range(len(engines)):
+            DB_REPLICA_HEALTHY.labels(str(index)).set_function(lambda index=index: self.is_healthy(index))
+
+    def is_healthy(self, index: int) -> bool:
+        return self._down_until[index] <= time.monotonic()
+
+    def mark_down(self, index: int):
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def connect(self) -> Connection | None:
+        """
+        :return: connection to the next healthy replica, None when every replica is down
+        """
+        for _ in range(len(self.engines)):
+            index = next(self._counter) % len(self.engines)
+            if not self.is_healthy(index):
+                continue
+            try:
+                return self.engines[index].connect()
+            except DBAPIError as exc:
+                logger.warning("replica %s failed its health check, skipping it for %ss: %s", index, self.retry_seconds, exc)
+                self.mark_down(index)
+        return None
+
+
+@lru_cache
+def get_replica_set() -> ReplicaSet:
+    return ReplicaSet(get_replica_engines(), get_settings().REPLICA_RETRY_SECONDS)
+
+
+@contextmanager
+def read_session(primary: bool = False):
+    """
+    Session for read-only work, on a replica unless primary is set, no replica is configured or all are down.
+    :param primary: read from the primary, e.g. to see the client's own recent writes
+    :return: session
+    """
+    connection = None
+    if primary or not get_settings().DATABASE_REPLICA_URLS:
+        target = "primary"
+    else:
+        connection = get_replica_set().connect()
+        target = "replica" if connection is not None else "primary_fallback"
+    DB_READ_SESSIONS.labels(target).inc()
+    db = SessionLocal(bind=connection if connection is not None else get_engine())
+    try:
+        yield db
+    finally:
+        db.close()
+        if connection is not None:
+            connection.close()
+
+
+def client_key(request: Request) -> str | None:
+    """
+    Stickiness is tracked per bearer token, only its hash is stored.
+    :param request:
+    :return: key or None for anonymous requests
+    """
+    authorization = request.headers.get("Authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()[:32]
+
+
+@lru_cache
+def recent_writers() -> LocalCache:
+    """
+    Clients of this worker that wrote within READ_YOUR_WRITES_SECONDS, also used while redis is unavailable.
+    """
+    settings = get_settings()
+    return LocalCache(settings.CACHE_LOCAL_MAXSIZE, settings.READ_YOUR_WRITES_SECONDS)
+
+
+def sticky_key(key: str) -> str:
+    return f"read-your-writes:{key}"
+
+
+async def mark_wrote(key: str):
+    recent_writers().set(key, True)
+    try:
+        await get_redis().set(sticky_key(key), 1, ex=get_settings().READ_YOUR_WRITES_SECONDS)
+    except RedisError as exc:
+        logger.debug("read-your-writes mark of %s not shared: %s", key, exc)
+
+
+async def reads_from_primary(request: Request) -> bool:
+    """
+    Dependency, True when the client wrote recently, in any worker, so it has to read its writes from the primary.
+    Write requests read from the primary anyway.
+    :param request:
+    :return:
+    """
+    if not get_settings().DATABASE_REPLICA_URLS or request.method in WRITE_METHODS:
+        return True
+    key = client_key(request)
+    if key is None:
+        return False
+    if recent_writers().get(key) is not MISSING:
+        return True
+    try:
+        return bool(await get_redis().exists(sticky_key(key)))
+    except RedisError:
+        return False
+
+
+def get_read_db(request: Request, primary: bool = Depends(reads_from_primary)):
+    """
+    Dependency for read-only handlers and authentication, use get_db for handlers that write.
+    Reads of a write request, e.g. its authentication, use the request's primary session.
+    Sync so the eager connection checkout runs in the threadpool.
+    :param request:
+    :param primary:
+    :return: session
+    """
+    if request.method in WRITE_METHODS:
+        db = request_session(request)
+        try:
+            yield db
+        finally:
+            db.close()
+        return
+    with read_session(primary) as db:
+        db.info[PINNED] = primary and bool(get_settings().DATABASE_REPLICA_URLS)
+        yield db
+
+
+def pinned_to_primary(db: Session) -> bool:
+    """
+    True for sessions of clients reading their own recent writes. Shared caches may still hold what a lagging
+    replica returned, reads on these sessions skip them.
+    :param db:
+    :return:
+    """
+    return db.info.get(PINNED, False)
+
+
+def register_read_your_writes(app: FastAPI):
+    @app.middleware("http")
+    async def remember_writes(request: Request, call_next):
+        """
+        Successful writes make the client's reads go to the primary for READ_YOUR_WRITES_SECONDS.
+        :param request:
+        :param call_next:
+        :return:
+        """
+        response = await call_next(request)
+        if request.method in WRITE_METHODS and response.status_code < 400 and get_settings().DATABASE_REPLICA_URLS:
+            key = client_key(request)
+            if key is not None:
+                await mark_wrote(key)
+        return response
@@ -0,0 +1,46 @@
+"""
+Production server runner.
+
+    python -m app.server
+
+Starts WEB_CONCURRENCY uvicorn worker processes without reload. Every worker sizes its
+database and redis pools from its share of the global connection budgets.
+"""
+import importlib.util
+import os
+
+import uvicorn
+
+from config import get_settings, worker_count
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def main():
+    settings = get_settings()
+    workers = worker_count(settings)
+    # Workers are separate processes, they read the resolved count to size their pools.
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    print(f"starting {workers} workers on {settings.HOST}:{settings.PORT} ({event_loop()}, {http_protocol()})")
+    uvicorn.run(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        timeout_keep_alive=settings.KEEP_ALIVE_TIMEOUT,
+        timeout_graceful_shutdown=settings.GRACEFUL_SHUTDOWN_TIMEOUT,
+        proxy_headers=True,
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
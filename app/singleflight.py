@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import secrets
+import time
+from typing import Any, Awaitable, Callable
+
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+Fetch = Callable[[], Awaitable[Any]]
+
+# Deletes the lock only while it still belongs to the caller.
+RELEASE_LOCK = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key in this process, they all share the first caller's result.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fetch: Fetch) -> Any:
+        """
+        Run fetch unless a call with the same key is already running, then wait for that one.
+        fetch runs in its own task, a cancelled caller, the first one included, does not cancel it for the others.
+        :param key:
+        :param fetch: coroutine function producing the value
+        :return: value
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            task.exception()  # waiters re-raise it, nobody else has to retrieve it
+
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+
+class RedisSingleFlight:
+    """
+    Coalesces calls across workers, the caller that takes the redis lock fetches and publishes the result,
+    the others wait for it. Callers that give up waiting fetch on their own.
+    """
+
+    def __init__(self, redis: Redis, prefix: str = "singleflight", lock_ms: int = 5000, result_ms: int = 1000,
+                 wait_s: float = 2.0, poll_s: float = 0.01):
+        self.redis = redis
+        self.prefix = prefix
+        self.lock_ms = lock_ms
+        self.result_ms = result_ms
+        self.wait_s = wait_s
+        self.poll_s = poll_s
+
+    async def do(self, key: str, fetch: Fetch, encode: Callable[[Any], str], decode: Callable[[str], Any]) -> Any:
+        """
+        :param key:
+        :param fetch: coroutine function producing the value
+        :param encode: value to string stored in redis
+        :param decode: string stored in redis to value
+        :return: value
+        """
+        lock_key = f"{self.prefix}:lock:{key}"
+        deadline = time.monotonic() + self.wait_s
+        while time.monotonic() < deadline:
+            token = secrets.token_hex(8)
+            if await self.redis.set(lock_key, token, nx=True, px=self.lock_ms):
+                try:
+                    value = await fetch()
+                    await self.redis.set(self._result_key(key, token), encode(value), px=self.result_ms)
+                    return value
+                finally:
+                    await self.redis.eval(RELEASE_LOCK, 1, lock_key, token)
+
+            leader = await self.redis.get(lock_key)
+            if leader is None:
+                continue  # released in between, try to lead
+            raw = await self._wait_for_leader(key, lock_key, leader, deadline)
+            if raw is not None:
+                return decode(raw)
+        logger.warning("single-flight wait for %s gave up, fetching directly", key)
+        return await fetch()
+
+    async def _wait_for_leader(self, key: str, lock_key: str, leader: str, deadline: float) -> str | None:
+        """
+        Results are stored under the leader's lock token, so a waiter never reads the result of an older flight.
+        :return: the leader's encoded result, None when the leader failed or the deadline passed
+        """
+        result_key = self._result_key(key, leader)
+        while time.monotonic() < deadline:
+            raw = await self.redis.get(result_key)
+            if raw is not None:
+                return raw
+            if await self.redis.get(lock_key) != leader:
+                return await self.redis.get(result_key)
+            await asyncio.sleep(self.poll_s)
+        return None
+
+    def _result_key(self, key: str, token: str) -> str:
+        return f"{self.prefix}:result:{key}:{token}"
@@ -5,6 +5,7 @@ from fastapi.testclient import TestClient
 
 from app.auth.dependencies import RoleChecker
 from app.db_connection import get_db
+from app.replicas import get_read_db
 from main import app
 
 mock_session = Mock()
@@ -19,6 +20,7 @@ def get_mock_session():
 
 
 app.dependency_overrides[get_db] = Mock(side_effect=get_mock_session)
+app.dependency_overrides[get_read_db] = Mock(side_effect=get_mock_session)
 app.dependency_overrides[role_checker] = Mock(side_effect=get_mock_session)
 
 
@@ -40,3 +42,32 @@ def fake_book_service():
 @pytest.fixture
 def test_client():
     return TestClient(app)
+
+
+class FakeRedis:
+    """
+    In-memory stand-in for the redis commands of the caches and the idempotency middleware.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def eval(self, script, numkeys, key, token):  # RELEASE_LOCK
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
@@ -0,0 +1,67 @@
+"""
+EXPLAIN helpers for asserting that the hot queries are served by indexes.
+
+With enable_seqscan off the planner still picks a sequential scan when no index can serve the query,
+so a Seq Scan in the plan means a missing index, however small the seeded tables are.
+"""
+import json
+from datetime import date, datetime
+
+from sqlalchemy import Connection, Executable, select, tuple_
+from sqlalchemy.dialects import postgresql
+
+from app import models
+
+
+def hot_queries() -> dict[str, Executable]:
+    """
+    :return: the statements of the hot request paths by name
+    """
+    books = models.Books
+    return {
+        "book_by_id": select(books).where(books.id == 1),
+        "books_page": select(books).order_by(books.id).offset(100).limit(100),
+        "user_by_email": select(models.User).where(models.User.email == "user1@example.com"),
+        "token_blacklisted": select(models.BlacklistedToken).where(models.BlacklistedToken.token == "token"),
+        "books_of_user": select(books).where(books.user_id == 1, tuple_(books.created_at, books.id) < (datetime(2024, 1, 1), 10 ** 9))
+        .order_by(books.created_at.desc(), books.id.desc()).limit(51),
+        "books_by_author": select(books).where(books.author == "Ajay Thakur"),
+        "books_by_publisher": select(books).where(books.publisher == "Penguin Books"),
+        "books_by_language": select(books).where(books.language == "ne"),
+        "books_by_language_by_id": select(books).where(books.language == "ne").order_by(books.id).limit(100),
+        "books_by_page_count": select(books).where(books.page_count >= 300).order_by(books.page_count, books.id).limit(100),
+        "books_published_between": select(books).where(books.published_date.between(date(1990, 1, 1), date(1999, 12, 31)))
+        .order_by(books.published_date, books.id).limit(100),
+        "changed_books": select(books).where(tuple_(books.updated_at, books.id) > (datetime(2024, 1, 1), 0),
+                                             books.updated_at < datetime(2024, 1, 2))
+        .order_by(books.updated_at, books.id).limit(501),
+        "deleted_books": select(models.BookTombstone)
+        .where(tuple_(models.BookTombstone.deleted_at, models.BookTombstone.book_id) > (datetime(2024, 1, 1), 0))
+        .order_by(models.BookTombstone.deleted_at, models.BookTombstone.book_id).limit(501),
+        "facet_counts": select(models.BookFacet.value, models.BookFacet.count)
+        .where(models.BookFacet.facet == "publisher", models.BookFacet.count > 0)
+        .order_by(models.BookFacet.count.desc(), models.BookFacet.value).limit(20),
+        "newest_books": select(books).order_by(books.created_at.desc()).limit(100),
+    }
+
+
+def explain(connection: Connection, statement: Executable) -> dict:
+    """
+    :param connection:
+    :param statement:
+    :return: root plan node of EXPLAIN (FORMAT JSON)
+    """
+    sql = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    raw = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """
+    :param plan: plan node
+    :return: relations read with a sequential scan anywhere in the plan
+    """
+    found = [plan["Relation Name"]] if plan.get("Node Type") == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found += seq_scans(child)
+    return found
@@ -0,0 +1,47 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app.admission import ConcurrencyLimiter
+from main import app
+
+
+def test_limiter_queues_then_hands_over_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test_handover", max_concurrency=1, max_queue=1, queue_timeout=1)
+        assert await limiter.acquire() is None
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        limiter.release()
+        assert await waiting is None
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_rejects_when_queue_full_or_timed_out():
+    async def scenario():
+        limiter = ConcurrencyLimiter("test_reject", max_concurrency=1, max_queue=1, queue_timeout=0.01)
+        assert await limiter.acquire() is None
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert await limiter.acquire() == "queue_full"
+        assert await waiting == "queue_timeout"
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_rejection_carries_cors_headers(monkeypatch):
+    async def reject(self):
+        return "queue_full"
+
+    monkeypatch.setattr(ConcurrencyLimiter, "acquire", reject)
+    response = TestClient(app).get("/api/v1/books/get_books/", headers={"Origin": "http://localhost:8000"})
+    assert response.status_code == 503
+    assert response.headers["access-control-allow-origin"] == "http://localhost:8000"
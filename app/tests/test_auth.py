@@ -1,4 +1,13 @@
-from app.auth.schemas import UserCreate
+import asyncio
+from unittest.mock import Mock
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app import models
+from app.auth import get_create_user
+from app.auth.get_create_user import create_user, get_cached_user_by_email
+from app.auth.schemas import User, UserCreate
 
 auth_prefix = "/api/v1/auth/"
 
@@ -22,3 +31,27 @@ def test_user_creation(fake_session, fake_user_service, test_client):
     assert response.status_code == 201
     assert fake_user_service.user_exists_called_once()
     assert fake_user_service.user_exists_called_once_with(user_data, fake_session)
+
+
+def test_taken_email_is_reported_by_the_insert():
+    db = Mock()
+    db.scalars.return_value.first.return_value = None
+    assert create_user(db, UserCreate(username="username", email="email", password="test123")) is None
+    statement = db.scalars.call_args.args[0]
+    assert "ON CONFLICT DO NOTHING RETURNING" in str(statement.compile(dialect=postgresql.dialect()))
+    db.expunge.assert_not_called()
+
+
+def test_cached_user_is_the_annotated_schema(monkeypatch):
+    user = models.User(id=1, username="reader", email="reader@example.com", hashed_password="hash", is_active=True,
+                       is_verified=True, role="user")
+    sessions = []
+    monkeypatch.setattr(get_create_user, "get_user_by_email", lambda db, email: sessions.append(db) or user)
+    monkeypatch.setattr("app.cache.get_settings", lambda: Mock(CACHE_ENABLED=False))
+
+    request_db = Session()
+    cached = asyncio.run(get_cached_user_by_email(request_db, "reader@example.com"))
+    assert sessions and sessions[0] is not request_db  # the shared load has its own session
+    assert isinstance(cached, User)
+    assert (cached.id, cached.is_verified, cached.role) == (1, True, "user")
+    assert "hashed_password" not in cached.model_dump()
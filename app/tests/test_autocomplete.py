@@ -0,0 +1,28 @@
+from app.books.autocomplete import PrefixIndex
+
+
+def test_matches_any_word_most_books_first():
+    index = PrefixIndex.build([("Ajay Thakur", 3), ("Sita Thapa", 10), ("Thomas Mann", 1), ("Ram Sharma", 50)])
+    assert index.search("tha", 10) == ["Sita Thapa", "Ajay Thakur"]
+    assert index.search("TH", 2) == ["Sita Thapa", "Ajay Thakur"]
+    assert index.search("ajay th", 10) == ["Ajay Thakur"]
+    assert index.search("x", 10) == []
+
+
+def test_add_is_idempotent():
+    index = PrefixIndex.build([("Penguin Books", 100)])
+    index.add("penguin  books")
+    index.add("Orbit")
+    index.add("Orbit")
+    assert len(index) == 2
+    assert index.search("pen", 10) == ["Penguin Books"]
+    assert index.search("or", 10) == ["Orbit"]
+
+
+def test_short_and_long_prefixes_rank_every_match():
+    names = [(f"Author {number:04}", number) for number in range(1, 1001)]
+    index = PrefixIndex.build(names + [("Zed Aardvark", 5000)])
+    assert index.search("a", 3) == ["Zed Aardvark", "Author 1000", "Author 0999"]
+    assert index.search("author", 2) == ["Author 1000", "Author 0999"]
+    index.add("Aaron Popular", 4000)
+    assert index.search("aa", 2) == ["Zed Aardvark", "Aaron Popular"]
@@ -0,0 +1,26 @@
+from scripts.benchmark import check_baseline, compare_to_baseline, percentile, summarize
+
+
+def test_percentile_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 99) == 0
+
+
+def test_compare_to_baseline_flags_regressions():
+    baseline = {"scenarios": {"get_books": summarize([0.010] * 100, 0, 1.0)}}
+    faster = {"scenarios": {"get_books": summarize([0.009] * 110, 0, 1.0)}}
+    slower = {"scenarios": {"get_books": summarize([0.020] * 50, 0, 1.0)}}
+
+    assert compare_to_baseline(faster, baseline, tolerance=0.1) == []
+    assert len(compare_to_baseline(slower, baseline, tolerance=0.1)) == 2
+    assert compare_to_baseline({"scenarios": {}}, baseline, tolerance=0.1) == ["get_books: missing from result"]
+
+
+def test_missing_baseline_fails_in_ci(tmp_path):
+    result = {"scenarios": {"get_books": summarize([0.010] * 100, 0, 1.0)}}
+    missing = tmp_path / "benchmark_baseline.json"
+    assert check_baseline(result, missing, tolerance=0.1, ci=True) == 2
+    assert check_baseline(result, missing, tolerance=0.1, ci=False) == 0
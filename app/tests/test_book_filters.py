@@ -0,0 +1,55 @@
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql
+
+from app import models
+from app.books.filters import BookFilter
+from app.db_connection import SessionLocal
+
+
+def compiled(book_filter: BookFilter) -> str:
+    query = book_filter.apply(SessionLocal().query(models.Books))
+    return str(query.statement.compile(dialect=postgresql.dialect()))
+
+
+def test_range_defaults_to_sorting_by_its_column():
+    book_filter = BookFilter(page_count_min=100)
+    assert book_filter.unindexable_reason() is None
+    assert "ORDER BY books.page_count ASC, books.id ASC" in compiled(book_filter)
+
+
+def test_combinations_needing_a_scan_are_rejected():
+    assert BookFilter(page_count_min=100, created_from=datetime(2020, 1, 1)).unindexable_reason()
+    assert BookFilter(page_count_min=100, sort="-created_at").unindexable_reason()
+    assert BookFilter(language="ne", sort="page_count").unindexable_reason()
+    assert BookFilter(page_count_min=500, page_count_max=100).unindexable_reason()
+
+
+def test_selective_filters_allow_any_sort():
+    book_filter = BookFilter(author="Ajay Thakur", created_from=datetime(2020, 1, 1), sort="-page_count")
+    assert book_filter.unindexable_reason() is None
+    sql = compiled(book_filter)
+    assert "books.author = " in sql and "books.created_at >= " in sql
+    assert "ORDER BY books.page_count DESC, books.id DESC" in sql
+
+
+def test_invalid_filter_is_rejected_with_400(test_client):
+    from app.auth.auth import get_current_active_user
+    from main import app
+
+    app.dependency_overrides[get_current_active_user] = lambda: None
+    try:
+        response = test_client.get("/api/v1/books/get_books/", params={"language": "ne", "sort": "-created_at"})
+    finally:
+        del app.dependency_overrides[get_current_active_user]
+    assert response.status_code == 400
+    assert "language" in response.json()["detail"]
+
+
+def test_published_date_range_is_inclusive_and_indexed():
+    book_filter = BookFilter(published_from=date(1990, 1, 1), published_to=date(1999, 12, 31))
+    assert book_filter.unindexable_reason() is None
+    sql = compiled(book_filter)
+    assert "books.published_date >= " in sql and "books.published_date <= " in sql
+    assert "ORDER BY books.published_date ASC, books.id ASC" in sql
+    assert BookFilter(published_from=date(2000, 1, 1), page_count_min=10).unindexable_reason()
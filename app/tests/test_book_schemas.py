@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from app import models
+from app.books.schemas import BooksResponse
+
+
+def test_orm_book_with_its_user_is_validated():
+    user = models.User(id=1, username="admin", email="admin@example.com")
+    book = models.Books(id=7, title="Muna Madan", author="Laxmi Prasad Devkota", publisher="Sajha Prakashan",
+                        published_date="1936-01-01", page_count=80, language="ne", created_at=datetime(2024, 1, 1),
+                        updated_at=datetime(2024, 1, 2), user=user)
+    response = BooksResponse.model_validate(book)
+    assert response.id == 7
+    assert response.user.model_dump() == {"id": 1, "username": "admin", "email": "admin@example.com"}
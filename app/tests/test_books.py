@@ -1,3 +1,15 @@
+import asyncio
+from datetime import date, datetime
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.books import service
+from app.books.cursors import decode_cursor, encode_cursor
+from app.books.schemas import BooksResponse
+from app.cache import LocalCache
+
 book_prefix = "/api/v1/books/"
 
 
@@ -6,3 +18,115 @@ def test_get_all_books(test_client, fake_book_service, fake_session):
     assert response.status_code == 200
     assert fake_book_service.get_all_books_called_once()
     assert fake_book_service.get_all_books_called_once_with(fake_session)
+
+
+def test_cursor_round_trip():
+    position = (datetime(2024, 5, 1, 12, 30, 15, 123456), 42)
+    assert decode_cursor(encode_cursor(*position)) == position
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def make_book(book_id: int) -> BooksResponse:
+    return BooksResponse(id=book_id, title="t", author="a", publisher="p", published_date=date(2000, 1, 1), page_count=1,
+                         language="en", created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1),
+                         user={"id": 1, "username": "admin", "email": "admin@example.com"})
+
+
+def test_batch_keeps_order_and_reports_missing(monkeypatch):
+    cached = service.book_cache.redis_key("3")
+    written = []
+
+    async def mget(keys):
+        return [make_book(3).model_dump_json() if key == cached else None for key in keys]
+
+    async def mset(items, ttl):
+        written.extend(key for key, _ in items)
+
+    loaded = []
+    monkeypatch.setattr("app.cache.mget", mget)
+    monkeypatch.setattr("app.cache.mset", mset)
+    monkeypatch.setattr(service, "load_books", lambda db, book_ids: loaded.append(book_ids) or {1: make_book(1), 7: make_book(7)})
+    monkeypatch.setattr(service.book_cache, "_local", LocalCache(maxsize=10, ttl=60))
+
+    batch = asyncio.run(service.get_books_batch(Session(), [7, 3, 9, 1, 3]))
+    assert [book.id for book in batch.items] == [7, 3, 1]
+    assert batch.missing == [9]
+    assert loaded == [[7, 9, 1]]
+    assert written == [service.book_cache.redis_key("1"), service.book_cache.redis_key("7")]
+
+
+def test_get_books_without_limit_returns_every_book(test_client, monkeypatch):
+    from app.auth.auth import get_current_active_user
+    from main import app
+
+    pages = []
+
+    async def get_books_page(skip, limit, book_filter):
+        pages.append((skip, limit))
+        return [make_book(1)]
+
+    monkeypatch.setattr(service, "get_books_page", get_books_page)
+    app.dependency_overrides[get_current_active_user] = lambda: None
+    try:
+        assert test_client.get(f"{book_prefix}get_books/").status_code == 200
+        assert test_client.get(f"{book_prefix}get_books/", params={"skip": 20, "limit": 10}).status_code == 200
+    finally:
+        del app.dependency_overrides[get_current_active_user]
+    assert pages == [(0, None), (20, 10)]
+
+
+def test_pinned_read_skips_the_book_cache(monkeypatch):
+    from app.replicas import PINNED
+
+    async def cached(key, loader):
+        raise AssertionError("a client reading its own writes must not be served from the cache")
+
+    monkeypatch.setattr(service.book_cache, "get_or_load", cached)
+    monkeypatch.setattr(service, "load_book", lambda db, book_id: make_book(book_id))
+    db = Session()
+    db.info[PINNED] = True
+    assert asyncio.run(service.get_book(db, 5)).id == 5
+
+
+def signed_in_as(role: str):
+    from app.auth.schemas import CachedUser
+
+    return lambda: CachedUser(id=1, username=role, email=f"{role}@example.com", role=role, is_active=True, is_verified=True)
+
+
+def test_admin_lists_the_books_of_any_user(test_client, monkeypatch):
+    from app.auth.auth import get_current_user
+    from app.books.schemas import BooksPage
+    from app.replicas import get_read_db
+    from main import app
+
+    monkeypatch.setattr(service, "load_user_books_page",
+                        lambda db, user_id, limit, cursor: BooksPage(items=[make_book(3)], total=1))
+    monkeypatch.setitem(app.dependency_overrides, get_read_db, lambda: None)
+    try:
+        app.dependency_overrides[get_current_user] = signed_in_as("admin")
+        response = test_client.get(f"{book_prefix}users/7/books/")
+        assert response.status_code == 200
+        assert response.json()["total"] == 1
+        app.dependency_overrides[get_current_user] = signed_in_as("user")
+        assert test_client.get(f"{book_prefix}users/7/books/").status_code == 403
+    finally:
+        del app.dependency_overrides[get_current_user]
+
+
+def test_shared_book_load_does_not_use_the_request_session(monkeypatch):
+    monkeypatch.setattr(service, "load_book_in_session", lambda book_id: make_book(book_id))
+    monkeypatch.setattr(service, "load_book", Mock(side_effect=AssertionError("request session used by a shared load")))
+    monkeypatch.setattr("app.cache.get_settings", lambda: Mock(CACHE_ENABLED=False))
+    monkeypatch.setattr(service, "get_settings", lambda: Mock(SINGLEFLIGHT_DISTRIBUTED=False))
+    assert asyncio.run(service.get_book(Session(), 8)).id == 8
+
+
+def test_unbounded_listing_is_not_cached(monkeypatch):
+    async def cached(key, loader):
+        raise AssertionError("the unbounded listing must not be cached")
+
+    monkeypatch.setattr(service.book_page_cache, "get_or_revalidate", cached)
+    monkeypatch.setattr(service, "load_books_page_in_session", lambda skip, limit, book_filter: [make_book(1), make_book(2)])
+    assert [book.id for book in asyncio.run(service.get_books_page(0, None))] == [1, 2]
@@ -0,0 +1,59 @@
+import asyncio
+from unittest.mock import Mock
+
+from app.auth.auth import get_current_user
+from app.auth.schemas import CachedUser
+from app.books import service
+from app.books.filters import BookSelection
+from app.books.schemas import BulkWriteResult
+from app.db_connection import get_db
+from main import app
+
+
+def test_writes_chunk_by_chunk_and_invalidates_written_books(monkeypatch):
+    invalidated = []
+
+    async def invalidate_books(*book_ids):
+        invalidated.append(book_ids)
+
+    monkeypatch.setattr(service, "invalidate_books", invalidate_books)
+    db = Mock()
+    # chunk of ids, then the ids the statement wrote; 5 changed concurrently and no longer matches
+    db.scalars.side_effect = [[1, 2], [2, 1], [5], [], []]
+    statements = []
+    result = asyncio.run(service.bulk_write(db, BookSelection(publisher="Pengiun"), statements.append))
+    assert result.ids == [1, 2] and result.count == 2
+    assert statements == [[1, 2], [5]]
+    assert invalidated == [(1, 2)]
+    assert db.commit.call_count == 2
+
+
+def test_selection_needs_a_criterion():
+    assert BookSelection().is_empty()
+    assert not BookSelection(ids=[1]).is_empty()
+    assert len(BookSelection(ids=[1], publisher="Orbit").clauses()) == 2
+
+
+def test_admin_bulk_writes_through_the_routes(test_client, monkeypatch):
+    writes = []
+
+    async def bulk_update_books(db, selection, values):
+        writes.append(("update", selection.publisher, values))
+        return BulkWriteResult(count=2, ids=[1, 2])
+
+    async def bulk_delete_books(db, selection):
+        writes.append(("delete", selection.ids, None))
+        return BulkWriteResult(count=1, ids=[3])
+
+    monkeypatch.setattr(service, "bulk_update_books", bulk_update_books)
+    monkeypatch.setattr(service, "bulk_delete_books", bulk_delete_books)
+    monkeypatch.setitem(app.dependency_overrides, get_db, lambda: None)
+    monkeypatch.setitem(app.dependency_overrides, get_current_user,
+                        lambda: CachedUser(id=1, username="admin", email="admin@example.com", role="admin", is_active=True))
+
+    response = test_client.patch("/api/v1/books/bulk_update_books/",
+                                 json={"where": {"publisher": "Pengiun"}, "patch": {"publisher": "Penguin"}})
+    assert response.status_code == 200 and response.json() == {"count": 2, "ids": [1, 2]}
+    response = test_client.post("/api/v1/books/bulk_delete_books/", json={"where": {"ids": [3]}})
+    assert response.status_code == 200 and response.json() == {"count": 1, "ids": [3]}
+    assert writes == [("update", "Pengiun", {"publisher": "Penguin"}), ("delete", [3], None)]
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+
+import pytest
+from pydantic import TypeAdapter
+
+from app.cache import (MISSING, LocalCache, StaleWhileRevalidateCache, TwoTierCache, apply_invalidation,
+                       listen_for_invalidations)
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_local_cache_expires_entries():
+    cache = LocalCache(maxsize=10, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_invalidation_from_other_worker_evicts_local_copy():
+    cache = TwoTierCache("test_invalidation", TypeAdapter(int))
+    cache._local = LocalCache(maxsize=10, ttl=60)
+    cache.local.set("1", 1)
+    cache.local.set("2", 2)
+    generation = cache.generation
+
+    apply_invalidation(json.dumps({"origin": "another-worker", "namespace": "test_invalidation", "keys": ["1"]}))
+
+    assert cache.local.get("1") is MISSING
+    assert cache.local.get("2") == 2
+    assert cache.generation == generation + 1
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(monkeypatch, fake_redis):
+    monkeypatch.setattr("app.cache.get_redis", lambda: fake_redis)
+    cache = StaleWhileRevalidateCache("test_swr", int, ttl_seconds=lambda: 0, stale_seconds=lambda: 60)
+    cache._local = LocalCache(maxsize=10, ttl=60)
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return len(loads)
+
+    async def scenario():
+        assert await cache.get_or_revalidate("page", loader) == 1
+        # Expired but within the stale window, served without waiting while a single refresh runs.
+        stale = await asyncio.gather(*(cache.get_or_revalidate("page", loader) for _ in range(5)))
+        assert stale == [1] * 5
+        await asyncio.gather(*cache._refreshing.values())
+        fresh_until, value = await cache.get("page")
+        assert value == 2
+
+    asyncio.run(scenario())
+    assert len(loads) == 2  # initial load and a single background refresh
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+        self.subscriptions = 0
+
+    async def subscribe(self, channel):
+        self.subscriptions += 1
+
+    async def get_message(self, ignore_subscribe_messages, timeout):
+        if not self.messages:
+            raise asyncio.CancelledError
+        return self.messages.pop(0)
+
+    async def aclose(self):
+        pass
+
+
+def test_idle_invalidation_channel_keeps_the_subscription(monkeypatch):
+    cache = TwoTierCache("test_idle_listener", TypeAdapter(int))
+    cache._local = LocalCache(maxsize=10, ttl=60)
+    invalidation = json.dumps({"origin": "another-worker", "namespace": "test_idle_listener", "keys": ["1"]})
+    pubsub = FakePubSub([None, None, {"type": "message", "data": invalidation}, None])
+    monkeypatch.setattr("app.cache.get_redis", lambda: type("Client", (), {"pubsub": lambda self, **kwargs: pubsub})())
+
+    async def scenario():
+        with pytest.raises(asyncio.CancelledError):
+            await listen_for_invalidations()
+
+    cache.local.set("2", 2)
+    generation = cache.generation
+    asyncio.run(scenario())
+    assert pubsub.subscriptions == 1
+    assert cache.generation == generation + 2  # cleared once on subscribe, then the one invalidation
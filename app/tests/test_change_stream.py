@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from app.books.stream import HEARTBEAT, RESET, ChangeHub, Subscription, deliver, events, hub
+from config import get_settings
+
+
+def test_slow_subscriber_is_dropped_with_a_reset():
+    change_hub = ChangeHub()
+    fast, slow = change_hub.subscribe(), change_hub.subscribe()
+    for book_id in range(get_settings().CHANGE_STREAM_BUFFER):
+        change_hub.publish(json.dumps({"op": "update", "ids": [book_id]}))
+        fast.queue.get_nowait()
+    change_hub.publish(json.dumps({"op": "delete", "ids": [7]}))
+    assert fast.queue.get_nowait() == b'event: delete\ndata: {"ids": [7]}\n\n'
+    assert change_hub.subscribers == {fast}
+    assert slow.queue.get_nowait() is RESET and slow.queue.empty()
+
+
+def test_stream_ends_after_a_reset():
+    async def read_all():
+        stream = events()
+        received = [await anext(stream)]
+        assert len(hub.subscribers) == 1
+        hub.publish(json.dumps({"op": "insert", "ids": [1, 2]}))
+        hub.reset_all()
+        return received + [event async for event in stream]
+
+    assert asyncio.run(read_all()) == [HEARTBEAT, RESET]
+    assert not hub.subscribers
+
+
+def test_unstarted_stream_holds_no_subscription():
+    stream = events()
+    assert not hub.subscribers
+    asyncio.run(stream.aclose())
+    assert not hub.subscribers
+
+
+def test_malformed_notification_is_skipped():
+    subscription = Subscription(10)
+    hub.subscribers.add(subscription)
+    try:
+        for payload in ("not json", '{"op": "update"}', "[1, 2]", json.dumps({"op": "delete", "ids": [3]})):
+            deliver(payload)
+    finally:
+        hub.unsubscribe(subscription)
+    assert subscription.queue.get_nowait() == b'event: delete\ndata: {"ids": [3]}\n\n'
+    assert subscription.queue.empty()
@@ -0,0 +1,50 @@
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+from app.books.cursors import decode_cursor
+from app.books.service import load_changes
+
+USER = SimpleNamespace(id=1, username="admin", email="admin@example.com")
+
+
+def rows(result):
+    query = Mock()
+    for method in ("options", "filter", "order_by", "limit"):
+        getattr(query, method).return_value = query
+    query.all.return_value = result
+    return query
+
+
+def book(book_id, updated_at):
+    return SimpleNamespace(id=book_id, title="t", author="a", publisher="p", published_date=date(2000, 1, 1), page_count=1,
+                           language="en", created_at=updated_at, updated_at=updated_at, user=USER)
+
+
+def changes(limit, since=None):
+    db = Mock()
+    db.scalar.return_value = datetime(2024, 1, 2)
+    db.query.side_effect = [rows([book(5, datetime(2024, 1, 1, 1)), book(2, datetime(2024, 1, 1, 3))]),
+                            rows([SimpleNamespace(book_id=9, deleted_at=datetime(2024, 1, 1, 2))])]
+    return load_changes(db, since, limit)
+
+
+def test_updates_and_tombstones_are_merged_in_order():
+    page = changes(limit=2)
+    assert [(change.id, change.deleted) for change in page.changes] == [(5, False), (9, True)]
+    assert page.changes[1].book is None
+    assert page.has_more
+    assert decode_cursor(page.next_cursor) == (datetime(2024, 1, 1, 2), 9)
+
+    page = changes(limit=3)
+    assert [change.id for change in page.changes] == [5, 9, 2]
+    assert not page.has_more
+
+
+def test_cursor_is_kept_when_nothing_changed():
+    db = Mock()
+    db.scalar.return_value = datetime(2024, 1, 2)
+    db.query.side_effect = [rows([]), rows([])]
+    page = load_changes(db, "WyIyMDI0LTAxLTAxVDAyOjAwOjAwIiw5XQ", 10)
+    assert page.changes == [] and not page.has_more
+    assert page.next_cursor == "WyIyMDI0LTAxLTAxVDAyOjAwOjAwIiw5XQ"
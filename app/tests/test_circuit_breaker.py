@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Dependency:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.delay = 0.0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("down")
+        return "ok"
+
+
+def test_opens_after_consecutive_failures_and_rejects_immediately():
+    breaker = CircuitBreaker("test_open", failure_threshold=3, slow_call_seconds=1, reset_seconds=60, failures=(ConnectionError,))
+    dependency = Dependency()
+    dependency.fail = True
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(ConnectionError):
+                await breaker.call(dependency)
+        assert breaker.state == OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(dependency)
+
+    asyncio.run(scenario())
+    assert dependency.calls == 3
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test_reset", failure_threshold=2, slow_call_seconds=1, reset_seconds=60, failures=(ConnectionError,))
+    dependency = Dependency()
+
+    async def scenario():
+        for fail in (True, False, True):
+            dependency.fail = fail
+            try:
+                await breaker.call(dependency)
+            except ConnectionError:
+                pass
+
+    asyncio.run(scenario())
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_trip_the_circuit():
+    breaker = CircuitBreaker("test_slow", failure_threshold=2, slow_call_seconds=0.005, reset_seconds=60, failures=(ConnectionError,))
+    dependency = Dependency()
+    dependency.delay = 0.01
+
+    async def scenario():
+        assert await breaker.call(dependency) == "ok"
+        assert await breaker.call(dependency) == "ok"
+
+    asyncio.run(scenario())
+    assert breaker.state == OPEN
+
+
+def test_half_open_probe_closes_or_reopens():
+    breaker = CircuitBreaker("test_probe", failure_threshold=1, slow_call_seconds=1, reset_seconds=0.01, failures=(ConnectionError,))
+    dependency = Dependency()
+
+    async def scenario():
+        dependency.fail = True
+        with pytest.raises(ConnectionError):
+            await breaker.call(dependency)
+        time.sleep(0.02)
+        with pytest.raises(ConnectionError):
+            await breaker.call(dependency)  # failed probe
+        assert breaker.state == OPEN
+
+        time.sleep(0.02)
+        dependency.fail = False
+        dependency.delay = 0.01
+        probe = asyncio.create_task(breaker.call(dependency))
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(dependency)  # only one probe at a time
+        assert await probe == "ok"
+        assert breaker.state == CLOSED
+
+    asyncio.run(scenario())
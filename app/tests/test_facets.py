@@ -0,0 +1,57 @@
+import os
+from datetime import date
+from unittest.mock import Mock
+
+import pytest
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.books.service import load_facets
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def test_facets_are_read_from_the_counters():
+    db = Mock()
+    db.execute.side_effect = [[("en", 40), ("ne", 2)], [("Penguin Books", 7)]]
+    facets = load_facets(db, ["language", "publisher"], 20)
+    assert [(count.value, count.count) for count in facets.language] == [("en", 40), ("ne", 2)]
+    assert [(count.value, count.count) for count in facets.publisher] == [("Penguin Books", 7)]
+    assert facets.author == []
+    assert db.execute.call_count == 2
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_counters_follow_inserts_updates_and_deletes():
+    engine = create_engine(TEST_DATABASE_URL)
+    books = models.Books
+
+    def counters(db: Session) -> dict:
+        rows = db.execute(select(models.BookFacet.facet, models.BookFacet.value, models.BookFacet.count)
+                          .where(models.BookFacet.count > 0))
+        return {(facet, value): count for facet, value, count in rows}
+
+    def grouped(db: Session) -> dict:
+        counts = {}
+        for facet in ("language", "publisher", "author"):
+            column = getattr(books, facet)
+            for value, count in db.execute(select(column, func.count()).where(column.isnot(None)).group_by(column)):
+                counts[(facet, value)] = count
+        return counts
+
+    try:
+        with Session(engine) as db:
+            new = [books(title=f"facet test {n}", author="Facet Author", publisher="Facet Press", language="xx",
+                         published_date=date(2000, 1, 1), page_count=10) for n in range(3)]
+            db.add_all(new)
+            db.flush()
+            new[0].publisher = "Other Facet Press"
+            new[1].page_count = 20
+            db.flush()
+            db.delete(new[2])
+            db.flush()
+            assert counters(db) == grouped(db)
+            db.rollback()
+    finally:
+        engine.dispose()
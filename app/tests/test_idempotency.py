@@ -0,0 +1,97 @@
+from unittest.mock import Mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from starlette.requests import Request
+
+from app.auth.auth import create_access_token
+from app.idempotency import register_idempotency, storage_key
+
+
+class Item(BaseModel):
+    name: str
+
+
+def make_client(monkeypatch, redis):
+    monkeypatch.setattr("app.idempotency.get_redis", lambda: redis)
+    app = FastAPI()
+    created = []
+
+    @app.post("/items/", status_code=201)
+    async def create_item(item: Item):
+        created.append(item.name)
+        return {"id": len(created), "name": item.name}
+
+    register_idempotency(app)
+    return TestClient(app), created
+
+
+def make_request(authorization: str | None = None, host: str = "10.0.0.1") -> Request:
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({"type": "http", "method": "POST", "headers": headers, "client": (host, 50000)})
+
+
+def test_retry_replays_the_stored_response(monkeypatch, fake_redis):
+    client, created = make_client(monkeypatch, fake_redis)
+    headers = {"Idempotency-Key": "retry-1"}
+    first = client.post("/items/", json={"name": "a"}, headers=headers)
+    retry = client.post("/items/", json={"name": "a"}, headers=headers)
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json() == {"id": 1, "name": "a"}
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert created == ["a"]
+
+    assert client.post("/items/", json={"name": "a"}).json() == {"id": 2, "name": "a"}
+
+
+def test_key_reused_for_another_request_is_rejected(monkeypatch, fake_redis):
+    client, created = make_client(monkeypatch, fake_redis)
+    client.post("/items/", json={"name": "a"}, headers={"Idempotency-Key": "k"})
+    response = client.post("/items/", json={"name": "b"}, headers={"Idempotency-Key": "k"})
+    assert response.status_code == 422
+    assert created == ["a"]
+
+
+def test_keys_are_scoped_by_user_or_address():
+    token, refreshed = (f"Bearer {create_access_token({'sub': 'a@example.com', 'n': n})}" for n in range(2))
+    assert storage_key(make_request(token), "1") == storage_key(make_request(refreshed), "1")
+    other_user = f"Bearer {create_access_token({'sub': 'b@example.com'})}"
+    assert storage_key(make_request(token), "1") != storage_key(make_request(other_user), "1")
+    assert storage_key(make_request(), "1") != storage_key(make_request(host="10.0.0.2"), "1")
+    assert storage_key(make_request("Bearer not-a-jwt"), "1") != storage_key(make_request(), "1")
+
+
+def test_duplicate_in_progress_waits_for_its_response(monkeypatch, fake_redis):
+    client, created = make_client(monkeypatch, fake_redis)
+    headers = {"Idempotency-Key": "dup"}
+    first = client.post("/items/", json={"name": "a"}, headers=headers)
+    # Replay the moment the first request still held the lock, it finishes while the duplicate waits.
+    [result_key] = fake_redis.data
+    stored = fake_redis.data.pop(result_key)
+    fake_redis.data[f"{result_key}:lock"] = "first-request"
+    polls = []
+
+    async def get(key):
+        polls.append(key)
+        if len(polls) == 3:
+            fake_redis.data[result_key] = stored
+            del fake_redis.data[f"{result_key}:lock"]
+        return fake_redis.data.get(key)
+
+    monkeypatch.setattr(fake_redis, "get", get)
+    duplicate = client.post("/items/", json={"name": "a"}, headers=headers)
+    assert duplicate.status_code == 201 and duplicate.json() == first.json()
+    assert duplicate.headers["Idempotent-Replayed"] == "true"
+    assert created == ["a"]
+
+
+def test_duplicate_gets_409_while_the_first_request_runs(monkeypatch, fake_redis):
+    monkeypatch.setattr("app.idempotency.get_settings",
+                        lambda: Mock(IDEMPOTENCY_LOCK_MS=10000, IDEMPOTENCY_WAIT_SECONDS=0.1, IDEMPOTENCY_TTL_SECONDS=60))
+    client, created = make_client(monkeypatch, fake_redis)
+    fake_redis.data[f"{storage_key(make_request(host='testclient'), 'busy')}:lock"] = "first-request"
+    response = client.post("/items/", json={"name": "a"}, headers={"Idempotency-Key": "busy"})
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    assert created == []
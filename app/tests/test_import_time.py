@@ -0,0 +1,41 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Cumulative `python -X importtime -c "import main"` budget, raise it on slow CI machines.
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 2500))
+
+LAZY_RESOURCES_CHECK = """
+import sys
+import main
+import config
+from app import db_connection, mail, redis_pool
+assert config.get_settings.cache_info().currsize == 0, "Settings built on import"
+assert db_connection.get_engine.cache_info().currsize == 0, "engine created on import"
+assert redis_pool._pool is None, "redis pool created on import"
+assert mail.get_mail.cache_info().currsize == 0, "mail client created on import"
+for module in ("fastapi_mail", "fastapi_redis_cache", "celery"):
+    assert module not in sys.modules, f"{module} imported on import"
+"""
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True)
+
+
+def test_import_main_creates_no_resources():
+    result = run_python("-c", LAZY_RESOURCES_CHECK)
+    assert result.returncode == 0, result.stderr
+
+
+def test_import_main_within_budget():
+    result = run_python("-X", "importtime", "-c", "import main")
+    assert result.returncode == 0, result.stderr
+    match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| main$", result.stderr, re.MULTILINE)
+    assert match, result.stderr[-2000:]
+    cumulative_ms = int(match.group(1)) / 1000
+    assert cumulative_ms < IMPORT_TIME_BUDGET_MS, f"import main took {cumulative_ms:.0f}ms, budget {IMPORT_TIME_BUDGET_MS:.0f}ms"
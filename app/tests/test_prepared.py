@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy.exc import DBAPIError
+
+from app.prepared import PREPARED_KEY, TOKEN_BLACKLISTED, run_prepared
+
+
+class PgError(Exception):
+    def __init__(self, message: str, pgcode: str):
+        super().__init__(message)
+        self.pgcode = pgcode
+
+
+def stale_plan() -> DBAPIError:
+    return DBAPIError("EXECUTE", {}, PgError("cached plan must not change result type", "0A000"))
+
+
+class FakeConnection:
+    def __init__(self):
+        self.info = {}
+        self.invalidated = False
+
+    def invalidate(self):
+        self.invalidated = True
+
+
+class FakeSession:
+    def __init__(self, in_transaction: bool = False):
+        self._in_transaction = in_transaction
+        self.conn = FakeConnection()
+        self.statements = []
+
+    def in_transaction(self):
+        return self._in_transaction
+
+    def connection(self):
+        self._in_transaction = True
+        return self.conn
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+    def rollback(self):
+        self._in_transaction = False
+        self.conn = FakeConnection()  # the pool hands out another connection
+
+
+def test_statement_is_prepared_once_per_connection():
+    db = FakeSession()
+    for _ in range(3):
+        assert run_prepared(db, TOKEN_BLACKLISTED, lambda statement: str(statement)).startswith("EXECUTE")
+    assert len(db.statements) == 1
+    assert db.statements[0].startswith(f"PREPARE {TOKEN_BLACKLISTED.server_name} (text)")
+    assert db.conn.info[PREPARED_KEY] == {TOKEN_BLACKLISTED.server_name}
+
+
+def test_stale_plan_reconnects_and_retries():
+    db = FakeSession()
+    calls = []
+
+    def run(statement):
+        calls.append(statement)
+        if len(calls) == 1:
+            raise stale_plan()
+        return "row"
+
+    stale_connection = db.conn
+    assert run_prepared(db, TOKEN_BLACKLISTED, run) == "row"
+    assert stale_connection.invalidated
+    assert len(db.statements) == 2  # prepared again on the new connection
+
+
+def test_stale_plan_inside_a_transaction_is_raised():
+    db = FakeSession(in_transaction=True)
+
+    def run(statement):
+        raise stale_plan()
+
+    with pytest.raises(DBAPIError):
+        run_prepared(db, TOKEN_BLACKLISTED, run)
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.tests.query_plans import explain, hot_queries, seq_scans
+
+# A database migrated to head, ideally loaded with scripts.seed_data.
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+def test_seq_scans_finds_nested_nodes():
+    plan = {"Node Type": "Limit", "Plans": [
+        {"Node Type": "Nested Loop", "Plans": [
+            {"Node Type": "Index Scan", "Relation Name": "users"},
+            {"Node Type": "Seq Scan", "Relation Name": "books"},
+        ]},
+    ]}
+    assert seq_scans(plan) == ["books"]
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+@pytest.mark.parametrize("name", sorted(hot_queries()))
+def test_hot_query_uses_an_index(name):
+    engine = create_engine(TEST_DATABASE_URL)
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SET enable_seqscan = off"))
+            plan = explain(connection, hot_queries()[name])
+    finally:
+        engine.dispose()
+    assert seq_scans(plan) == [], plan
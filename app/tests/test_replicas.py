@@ -0,0 +1,46 @@
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from starlette.requests import Request
+
+from app.db_connection import request_session
+from app.replicas import ReplicaSet, get_read_db, pinned_to_primary
+
+
+class FakeEngine:
+    def __init__(self, name: str, healthy: bool = True):
+        self.name = name
+        self.healthy = healthy
+        self.connects = 0
+
+    def connect(self):
+        self.connects += 1
+        if not self.healthy:
+            raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+        return self.name
+
+
+def test_round_robin_over_replicas():
+    replicas = ReplicaSet((FakeEngine("a"), FakeEngine("b")), retry_seconds=60)
+    assert [replicas.connect() for _ in range(4)] == ["a", "b", "a", "b"]
+
+
+def test_failing_replica_is_skipped_until_retry():
+    broken = FakeEngine("b", healthy=False)
+    replicas = ReplicaSet((FakeEngine("a"), broken), retry_seconds=60)
+    assert [replicas.connect() for _ in range(4)] == ["a", "a", "a", "a"]
+    assert broken.connects == 1
+    assert not replicas.is_healthy(1)
+
+
+def test_no_connection_when_every_replica_is_down():
+    replicas = ReplicaSet((FakeEngine("a", healthy=False),), retry_seconds=60)
+    assert replicas.connect() is None
+
+
+def test_write_request_reads_share_its_primary_session(monkeypatch):
+    monkeypatch.setattr("app.db_connection.get_session", Session)
+    request = Request({"type": "http", "method": "POST", "headers": [], "state": {}})
+
+    db = next(get_read_db(request, primary=True))
+    assert db is request_session(request)
+    assert not pinned_to_primary(db)
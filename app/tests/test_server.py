@@ -0,0 +1,20 @@
+from types import SimpleNamespace
+
+from app import db_connection
+from config import split_budget
+
+
+def test_db_pool_sizes_share_budget_between_workers(monkeypatch):
+    settings = SimpleNamespace(DB_CONNECTION_BUDGET=80, WEB_CONCURRENCY=4)
+    monkeypatch.setattr(db_connection, "get_settings", lambda: settings)
+
+    pool_size, max_overflow = db_connection.db_pool_sizes()
+
+    assert (pool_size, max_overflow) == (15, 5)
+    assert (pool_size + max_overflow) * settings.WEB_CONCURRENCY <= settings.DB_CONNECTION_BUDGET
+
+
+def test_split_budget_keeps_one_connection_per_worker():
+    assert split_budget(10, 3) == 3
+    assert split_budget(2, 8) == 1
+    assert split_budget(10, 0) == 10
@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_fetch():
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": 1}
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("book:1", fetch) for _ in range(10)))
+        assert flight.in_flight() == 0
+        return results
+
+    results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert results == [{"id": 1}] * 10
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database down")
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert await flight.do("key", ok) == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_the_leader():
+    async def slow():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def scenario():
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("key", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", slow))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert await leader == 42
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_leader_does_not_fail_the_waiters():
+    async def slow():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def scenario():
+        flight = SingleFlight()
+        leader = asyncio.create_task(flight.do("key", slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await waiter == 42
+        assert flight.in_flight() == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+import time
+
+from fastapi import FastAPI
+from sqlalchemy import text
+
+from app.auth.auth import is_token_blacklisted
+from app.auth.get_create_user import get_user_by_email
+from app.books import service
+from app.db_connection import get_engine, get_session
+from app.redis_pool import get_redis
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def fill_db_pool(connections: int) -> int:
+    """
+    Opens connections to the database at the same time so the pool keeps them for the first requests.
+    :param connections: requested number of connections, capped at the pool size
+    :return: number of connections opened
+    """
+    engine = get_engine()
+    connections = min(connections, engine.pool.size())
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            opened.append(connection)
+    finally:
+        for connection in opened:
+            connection.close()  # returned to the pool, not closed
+    return len(opened)
+
+
+def run_hot_statements():
+    """
+    Runs the hot lookups once so the SQLAlchemy compiled cache is warm and their statements are prepared.
+    :return:
+    """
+    db = get_session()
+    try:
+        get_user_by_email(db, "warmup@localhost")
+        is_token_blacklisted(db, "warmup")
+        service.load_book(db, 0)
+    finally:
+        db.close()
+
+
+async def preload_books(book_ids: list[int]):
+    """
+    Loads the hot books into the book cache.
+    :param book_ids:
+    :return:
+    """
+    db = get_session()
+    try:
+        for book_id in book_ids:
+            await service.get_book(db, book_id)
+    finally:
+        db.close()
+
+
+async def warm_up(app: FastAPI):
+    """
+    Warm up connections and caches, the readiness endpoint reports ready once this has finished.
+    :param app:
+    :return:
+    """
+    settings = get_settings()
+    started = time.perf_counter()
+    try:
+        if settings.WARMUP_ENABLED:
+            opened = await asyncio.to_thread(fill_db_pool, settings.WARMUP_DB_CONNECTIONS)
+            await get_redis().ping()
+            await asyncio.to_thread(run_hot_statements)
+            await preload_books(settings.WARMUP_BOOK_IDS)
+            app.openapi()  # builds the pydantic JSON schemas of every route
+            logger.info("warm-up finished in %.3fs, %s database connections", time.perf_counter() - started, opened)
+    except Exception as exc:
+        # A cold worker is still better than none, the first requests just pay for the connects.
+        logger.error("warm-up failed after %.3fs: %s", time.perf_counter() - started, exc)
+    finally:
+        app.state.ready = True
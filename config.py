@@ -1,3 +1,6 @@
+import os
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings
 
 
@@ -23,6 +26,59 @@ class Settings(BaseSettings):
     VALIDATE_CERTS: bool
     DOMAIN: str
     TEMPLATE_FOLDER: str
+    WARMUP_ENABLED: bool = True
+    WARMUP_DB_CONNECTIONS: int = 5
+    WARMUP_BOOK_IDS: list[int] = []
+    HOST: str = '0.0.0.0'
+    PORT: int = 8080
+    WEB_CONCURRENCY: int = 0  # 0 uses one worker per cpu
+    DB_CONNECTION_BUDGET: int = 80  # total database connections shared by all workers, per server
+    PREPARED_STATEMENTS_ENABLED: bool = True  # disable behind a transaction pooling pgbouncer
+    DATABASE_REPLICA_URLS: list[str] = []  # read replicas, a json list of postgresql:// urls
+    REPLICA_RETRY_SECONDS: float = 10.0  # a replica failing its health check is skipped for this long
+    READ_YOUR_WRITES_SECONDS: int = 5  # reads of a client go to the primary for this long after it wrote, keep above replica lag
+    REDIS_CONNECTION_BUDGET: int = 200  # total redis connections shared by all workers
+    REDIS_POOL_TIMEOUT: float = 1.0  # seconds to wait for a free pooled connection
+    REDIS_SOCKET_TIMEOUT: float = 1.0
+    REDIS_CONNECT_TIMEOUT: float = 1.0
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failed or slow calls opening the circuit
+    REDIS_BREAKER_SLOW_CALL_SECONDS: float = 0.25
+    REDIS_BREAKER_RESET_SECONDS: float = 5.0  # open time before a half-open probe
+    GRACEFUL_SHUTDOWN_TIMEOUT: int = 30
+    KEEP_ALIVE_TIMEOUT: int = 5
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_AUTH_CONCURRENCY: int = 8  # bcrypt bound
+    ADMISSION_AUTH_QUEUE: int = 32
+    ADMISSION_BOOKS_READ_CONCURRENCY: int = 64
+    ADMISSION_BOOKS_READ_QUEUE: int = 256
+    ADMISSION_BOOKS_WRITE_CONCURRENCY: int = 16
+    ADMISSION_BOOKS_WRITE_QUEUE: int = 64
+    ADMISSION_QUEUE_TIMEOUT: float = 1.0
+    ADMISSION_RETRY_AFTER: int = 1
+    SINGLEFLIGHT_DISTRIBUTED: bool = False  # also coalesce across workers with a redis lock
+    SINGLEFLIGHT_LOCK_MS: int = 5000
+    SINGLEFLIGHT_WAIT_SECONDS: float = 2.0
+    IDEMPOTENCY_TTL_SECONDS: int = 86400  # responses to POSTs with an Idempotency-Key are replayed for this long
+    IDEMPOTENCY_LOCK_MS: int = 10000  # concurrent duplicates wait while the first one runs, longer than the slowest POST
+    IDEMPOTENCY_WAIT_SECONDS: float = 5.0  # a duplicate waiting longer gets 409
+    CACHE_ENABLED: bool = True
+    CACHE_TTL_SECONDS: int = 300
+    CACHE_LOCAL_TTL_SECONDS: float = 5.0
+    CACHE_LOCAL_MAXSIZE: int = 10000
+    CACHE_INVALIDATION_CHANNEL: str = 'cache-invalidation'
+    BOOK_LIST_TTL_SECONDS: int = 10
+    AUTOCOMPLETE_REFRESH_SECONDS: float = 5.0  # delta refresh of the in-memory prefix indexes
+    AUTOCOMPLETE_FULL_REFRESH_SECONDS: int = 3600  # full rebuild, drops names without books
+    AUTOCOMPLETE_LAG_SECONDS: int = 60  # overlap of delta refreshes, longer than the longest write transaction
+    AUTOCOMPLETE_FUZZY_MIN_LENGTH: int = 3  # shorter queries have no trigrams
+    BOOK_BATCH_MAX_IDS: int = 100  # ids per batch request
+    BULK_WRITE_CHUNK_SIZE: int = 1000  # rows per transaction of bulk updates and deletes, bounds how long rows stay locked
+    BULK_WRITE_MAX_IDS: int = 10000  # ids per bulk write request, filters are not limited
+    CHANGE_FEED_LAG_SECONDS: int = 10  # the change feed ends this far in the past, longer than the longest write transaction
+    CHANGE_STREAM_MAX_SUBSCRIBERS: int = 5000  # live stream clients per worker
+    CHANGE_STREAM_BUFFER: int = 100  # events buffered per client, a client falling further behind is dropped
+    CHANGE_STREAM_HEARTBEAT_SECONDS: float = 15.0
+    BOOK_LIST_STALE_SECONDS: int = 30  # served stale while revalidating for this long after the ttl
 
     class Config:
         env_file = ".env"
@@ -30,8 +86,51 @@ class Settings(BaseSettings):
         extra = "ignore"
 
 
-settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Settings are read from the environment on first use instead of at import time.
+    :return: settings
+    """
+    return Settings()
+
+
+def worker_count(settings: Settings) -> int:
+    """
+    Number of server worker processes.
+    :param settings:
+    :return: WEB_CONCURRENCY or the cpu count when it is 0
+    """
+    return settings.WEB_CONCURRENCY or os.cpu_count() or 1
+
+
+def split_budget(budget: int, workers: int) -> int:
+    """
+    Share of a global connection budget for one worker process.
+    :param budget: connections available to all workers together
+    :param workers:
+    :return: connections for one worker, at least 1
+    """
+    return max(1, budget // max(1, workers))
+
 
-broker_url = settings.REDIS_URL
-result_backend = settings.REDIS_URL
 broker_connection_retry_on_startup = True
+
+_LAZY_ATTRIBUTES = ("settings", "broker_url", "result_backend")
+
+
+def __getattr__(name: str):
+    """
+    Keeps `from config import settings` and celery's config_from_object('config') working without building Settings on import.
+    :param name:
+    :return: lazily resolved attribute
+    """
+    if name == "settings":
+        return get_settings()
+    if name in ("broker_url", "result_backend"):
+        return get_settings().REDIS_URL
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES))
@@ -1,28 +1,40 @@
-import os
+import asyncio
 from contextlib import asynccontextmanager
 from typing import Optional
 
-import uvicorn
 from fastapi import FastAPI, Header
 from fastapi.middleware.cors import CORSMiddleware
-from redis import Redis
 
+from app.admission import register_admission_control
 from app.auth.routers import auth_router
+from app.books.autocomplete import keep_autocomplete_fresh
 from app.books.routers import books_router
+from app.books.stream import listen_for_book_changes
+from app.cache import listen_for_invalidations
 from app.custom_exception import register_all_errors
 from app.db_connection import shutdown, startup
+from app.health import health_router
+from app.idempotency import register_idempotency
+from app.metrics import metrics_router
 from app.middleware import register_middleware
-
-REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379")
-
-redis_client = Redis.from_url(REDIS_URL, decode_responses=True)
+from app.replicas import register_read_your_writes
+from app.warmup import warm_up
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("server starting....")
+    app.state.ready = False
     await startup()
+    warmup_task = asyncio.create_task(warm_up(app))
+    invalidation_task = asyncio.create_task(listen_for_invalidations())
+    autocomplete_task = asyncio.create_task(keep_autocomplete_fresh())
+    change_listener_task = asyncio.create_task(listen_for_book_changes())
     yield
+    warmup_task.cancel()
+    invalidation_task.cancel()
+    autocomplete_task.cancel()
+    change_listener_task.cancel()
     await shutdown()
     print("server stopped....")
 
@@ -47,6 +59,13 @@ origins = [
     "http://localhost:8080",
 ]
 
+# process_time(app)
+register_all_errors(app)  # Register All Errors from custom_exception file in main file
+register_middleware(app)  # Register All Middleware from middlewares file in main file
+register_read_your_writes(app)
+register_idempotency(app)  # Outside of the other middleware, a replay skips them
+register_admission_control(app)  # Registered after the other middleware so it rejects before any other work
+# Outermost, so responses produced by middleware like the admission 503 carry the CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -55,10 +74,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# process_time(app)
-register_all_errors(app)  # Register All Errors from custom_exception file in main file
-register_middleware(app)  # Register All Middleware from middlewares file in main file
-
 
 # app.add_exception_handler(InvalidToken, create_exception_handler(status_code=status.HTTP_401_UNAUTHORIZED, message={"message": "Invalid Token"}))
 # app.add_exception_handler(InsufficientPermission,
@@ -107,7 +122,11 @@ async def get_headers(
 
 app.include_router(auth_router, prefix=f'/api/{ver_sion}/auth')
 app.include_router(books_router, prefix=f'/api/{ver_sion}/books')
+app.include_router(health_router, prefix='/health')
+app.include_router(metrics_router)
 
-# Run Project At Specified Port
+# Run Project At Specified Port, use `uvicorn main:app --reload` for development
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="0.0.0.0", port=8080, reload=True)
+    from app.server import main
+
+    main()
@@ -0,0 +1,288 @@
+"""
+Load-test and benchmark harness for the Books API.
+
+Seeds the local database with an admin user and a set of books, then drives the
+login, get_books, get_single_book, create_book and logout scenarios against a
+running server at a fixed concurrency. The latency percentiles and throughput of
+every scenario are reported as JSON and compared against a committed baseline.
+
+Usage:
+    docker compose up -d dev-db redis
+    alembic -n tryfastapi upgrade head
+    uvicorn main:app --port 8000
+    python -m scripts.benchmark --seed --concurrency 32 --duration 60
+    python -m scripts.benchmark --write-baseline    # record a new baseline
+    python -m scripts.benchmark --ci                # fail when no baseline is committed, default when CI is set
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+BASE_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BASE_DIR / "benchmark_baseline.json"
+
+AUTH_PREFIX = "/api/v1/auth"
+BOOKS_PREFIX = "/api/v1/books"
+
+BENCH_EMAIL = "bench-admin@example.com"
+BENCH_USERNAME = "bench-admin"
+BENCH_PASSWORD = "bench-password"
+# get_books reads one fixed size page, the unbounded listing grows with every create_book of the run.
+BOOKS_PAGE_SIZE = 50
+
+# Relative weight of every scenario in the request mix.
+DEFAULT_MIX = {
+    "login": 5,
+    "get_books": 30,
+    "get_single_book": 50,
+    "create_book": 10,
+    "logout": 5,
+}
+
+LANGUAGES = ["en", "ne", "hi", "fr", "de", "es"]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of values.
+    :param values:
+    :param pct: percentile between 0 and 100
+    :return: percentile value, 0 for an empty list
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """
+    Summarize the latencies (in seconds) of a scenario.
+    :param latencies:
+    :param errors:
+    :param elapsed: wall clock duration of the run in seconds
+    :return: count, errors, rps and p50/p95/p99 in milliseconds
+    """
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+    }
+
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Compare a benchmark result with a baseline.
+    A scenario regresses when its p95 grows or its rps drops by more than tolerance.
+    :param result:
+    :param baseline:
+    :param tolerance: allowed relative change, e.g. 0.1 for 10%
+    :return: list of regression messages, empty when there are none
+    """
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        current = result.get("scenarios", {}).get(name)
+        if current is None:
+            regressions.append(f"{name}: missing from result")
+            continue
+        if base["p95_ms"] and current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {current['p95_ms']}ms > baseline {base['p95_ms']}ms")
+        if base["rps"] and current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {current['rps']} < baseline {base['rps']}")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors, baseline {base.get('errors', 0)}")
+    return regressions
+
+
+def fake_book(rng: random.Random, index: int) -> dict:
+    """
+    Deterministic book payload.
+    :param rng:
+    :param index:
+    :return: book fields accepted by BooksCreate
+    """
+    return {
+        "title": f"Bench Book {index}",
+        "author": f"Author {rng.randint(1, 500)}",
+        "publisher": f"Publisher {rng.randint(1, 50)}",
+        "published_date": (date(1950, 1, 1) + timedelta(days=rng.randint(0, 27000))).isoformat(),
+        "page_count": rng.randint(50, 1200),
+        "language": rng.choice(LANGUAGES),
+    }
+
+
+def seed(books: int, seed_value: int) -> list[int]:
+    """
+    Create the verified benchmark admin and insert books owned by it.
+    :param books: number of books to insert
+    :param seed_value:
+    :return: ids of the books owned by the benchmark admin
+    """
+    from sqlalchemy import insert, select
+
+    from app import models
+    from app.auth.auth import get_password_hash
+    from app.db_connection import get_session
+
+    rng = random.Random(seed_value)
+    db = get_session()
+    try:
+        user = db.query(models.User).filter(models.User.email == BENCH_EMAIL).first()
+        if user is None:
+            user = models.User(username=BENCH_USERNAME, email=BENCH_EMAIL, hashed_password=get_password_hash(BENCH_PASSWORD),
+                               role=models.UserRole.ADMIN.value, is_active=True, is_verified=True)
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+        existing = db.query(models.Books).filter(models.Books.user_id == user.id).count()
+        rows = [dict(fake_book(rng, index), user_id=user.id) for index in range(existing, books)]
+        if rows:
+            db.execute(insert(models.Books), rows)
+            db.commit()
+        return list(db.scalars(select(models.Books.id).where(models.Books.user_id == user.id).limit(books)))
+    finally:
+        db.close()
+
+
+class Runner:
+    """
+    Closed-loop load generator, every worker sends its next request once the previous one finished.
+    """
+
+    def __init__(self, client: httpx.AsyncClient, book_ids: list[int], mix: dict, seed_value: int):
+        self.client = client
+        self.book_ids = book_ids
+        self.mix = mix
+        self.seed_value = seed_value
+        self.latencies = {name: [] for name in mix}
+        self.errors = {name: 0 for name in mix}
+
+    async def login(self) -> str:
+        response = await self.client.post(f"{AUTH_PREFIX}/token/", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+        response.raise_for_status()
+        return response.json()["access_token"]
+
+    async def timed(self, name: str, method: str, url: str, **kwargs) -> httpx.Response | None:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[name] += 1
+            return None
+        elapsed = time.perf_counter() - start
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        else:
+            self.latencies[name].append(elapsed)
+        return response
+
+    async def worker(self, worker_id: int, deadline: float):
+        rng = random.Random(self.seed_value + worker_id)
+        token = await self.login()
+        headers = {"Authorization": f"Bearer {token}"}
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        counter = 0
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            counter += 1
+            if name == "login":
+                await self.timed(name, "POST", f"{AUTH_PREFIX}/token/", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+            elif name == "get_books":
+                await self.timed(name, "GET", f"{BOOKS_PREFIX}/get_books/", params={"limit": BOOKS_PAGE_SIZE}, headers=headers)
+            elif name == "get_single_book":
+                book_id = rng.choice(self.book_ids)
+                await self.timed(name, "GET", f"{BOOKS_PREFIX}/get_single_book/{book_id}/", headers=headers)
+            elif name == "create_book":
+                payload = fake_book(rng, worker_id * 1_000_000 + counter)
+                await self.timed(name, "POST", f"{BOOKS_PREFIX}/create_book/", json=payload, headers=headers)
+            elif name == "logout":
+                # Logging out blacklists the token, so it needs a throwaway one.
+                throwaway = await self.login()
+                await self.timed(name, "POST", f"{AUTH_PREFIX}/logout/", headers={"Authorization": f"Bearer {throwaway}"})
+
+
+async def run(base_url: str, book_ids: list[int], concurrency: int, duration: float, mix: dict, seed_value: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        runner = Runner(client, book_ids, mix, seed_value)
+        deadline = time.perf_counter() + duration
+        start = time.perf_counter()
+        await asyncio.gather(*(runner.worker(worker_id, deadline) for worker_id in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    scenarios = {name: summarize(runner.latencies[name], runner.errors[name], elapsed) for name in mix}
+    all_latencies = [latency for latencies in runner.latencies.values() for latency in latencies]
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "total": summarize(all_latencies, sum(runner.errors.values()), elapsed),
+        "scenarios": scenarios,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--seed", action="store_true", help="seed the database before running")
+    parser.add_argument("--books", type=int, default=1000, help="number of books to seed")
+    parser.add_argument("--random-seed", type=int, default=42)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    parser.add_argument("--write-baseline", action="store_true", help="store the result as the new baseline")
+    parser.add_argument("--output", type=Path, help="write the JSON result to this file")
+    parser.add_argument("--ci", action="store_true", default=bool(os.environ.get("CI")),
+                        help="a missing baseline is an error instead of a notice")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.seed:
+        book_ids = seed(args.books, args.random_seed)
+    else:
+        book_ids = list(range(1, args.books + 1))
+    result = asyncio.run(run(args.base_url, book_ids, args.concurrency, args.duration, DEFAULT_MIX, args.random_seed))
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        args.output.write_text(output + "\n")
+    if args.write_baseline:
+        args.baseline.write_text(output + "\n")
+        return 0
+    return check_baseline(result, args.baseline, args.tolerance, args.ci)
+
+
+def check_baseline(result: dict, baseline: Path, tolerance: float, ci: bool) -> int:
+    """
+    :param result:
+    :param baseline: path of the committed baseline
+    :param tolerance:
+    :param ci: without a baseline nothing would be gated, so a missing one fails the run
+    :return: exit code, 1 for regressions, 2 for a missing baseline in CI
+    """
+    if not baseline.exists():
+        print(f"No baseline at {baseline}, run with --write-baseline on the reference machine and commit it.", file=sys.stderr)
+        return 2 if ci else 0
+    regressions = compare_to_baseline(result, json.loads(baseline.read_text()), tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
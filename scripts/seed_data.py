@@ -0,0 +1,227 @@
+"""
+Synthetic data generator for the users, books and blacklisted_tokens tables.
+
+The generated data is deterministic for a given --seed and is bulk loaded with
+COPY in chunks, so tens of millions of rows load in minutes. Authors, publishers,
+languages and book owners follow a Zipf-like distribution to mimic the skew of a
+real catalogue, which matters when evaluating indexes and query plans.
+
+Usage:
+    python -m scripts.seed_data --users 100000 --books 10000000 --blacklisted-tokens 500000
+    python -m scripts.seed_data --books 1000000 --truncate --seed 7
+"""
+import argparse
+import io
+import itertools
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import psycopg2
+
+# One bcrypt hash of "password" shared by every generated user, hashing per row would dominate the load time.
+PASSWORD = "password"
+
+FIRST_NAMES = ["Ajay", "Sita", "Ram", "Gita", "Hari", "Maya", "John", "Emma", "Liam", "Olivia", "Noah", "Ava", "Arjun", "Priya",
+               "Ravi", "Anita", "Lucas", "Mia", "Ethan", "Sofia", "Kiran", "Asha", "Omar", "Lina", "Yuki", "Hana", "Ivan", "Elena"]
+LAST_NAMES = ["Thakur", "Sharma", "Shrestha", "Gurung", "Rai", "Smith", "Johnson", "Brown", "Garcia", "Miller", "Khan", "Singh",
+              "Tamang", "Magar", "Adhikari", "Ito", "Kim", "Lee", "Novak", "Rossi", "Dubois", "Muller", "Silva", "Costa"]
+PUBLISHER_WORDS = ["Penguin", "Harper", "Orbit", "Summit", "Himalayan", "Lotus", "River", "Oxford", "Cedar", "Beacon", "Atlas",
+                   "Northern", "Golden", "Blue", "Open", "Quill"]
+PUBLISHER_SUFFIXES = ["Books", "Press", "Publishing", "House", "Media", "& Sons"]
+TITLE_WORDS = ["Shadow", "River", "Mountain", "Silent", "Last", "Hidden", "Secret", "Garden", "Empire", "Light", "Storm", "Journey",
+               "Dream", "Night", "Fire", "Winter", "City", "Code", "Memory", "Ocean", "Song", "Stone", "Road", "Sky"]
+LANGUAGES = ["en", "ne", "hi", "es", "fr", "de", "zh", "ja", "pt", "ru"]
+
+EPOCH = datetime(2015, 1, 1)
+SPAN_SECONDS = int((datetime(2025, 1, 1) - EPOCH).total_seconds())
+
+
+def zipf_cum_weights(size: int, exponent: float) -> list[float]:
+    """
+    Cumulative Zipf weights for ranks 1..size, usable as random.choices(cum_weights=...).
+    :param size:
+    :param exponent: skew, 0 is uniform and larger values are more skewed
+    :return: cumulative weights
+    """
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def person_name(index: int) -> str:
+    first = FIRST_NAMES[index % len(FIRST_NAMES)]
+    last = LAST_NAMES[(index // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    generation = index // (len(FIRST_NAMES) * len(LAST_NAMES))
+    return f"{first} {last}" if generation == 0 else f"{first} {last} {generation + 1}"
+
+
+def publisher_name(index: int) -> str:
+    word = PUBLISHER_WORDS[index % len(PUBLISHER_WORDS)]
+    suffix = PUBLISHER_SUFFIXES[(index // len(PUBLISHER_WORDS)) % len(PUBLISHER_SUFFIXES)]
+    generation = index // (len(PUBLISHER_WORDS) * len(PUBLISHER_SUFFIXES))
+    return f"{word} {suffix}" if generation == 0 else f"{word} {suffix} {generation + 1}"
+
+
+def timestamp(rng: random.Random) -> datetime:
+    return EPOCH + timedelta(seconds=rng.randrange(SPAN_SECONDS))
+
+
+def chunk_rng(seed: int, table: str, chunk: int) -> random.Random:
+    """
+    Every chunk has its own generator so a chunk is reproducible on its own.
+    """
+    return random.Random(f"{seed}:{table}:{chunk}")
+
+
+def user_rows(rng: random.Random, first_id: int, count: int, hashed_password: str):
+    for user_id in range(first_id, first_id + count):
+        role = "admin" if rng.random() < 0.01 else "user"
+        verified = "t" if rng.random() < 0.9 else "f"
+        yield f"{user_id}\tuser{user_id}\tuser{user_id}@example.com\t{hashed_password}\tt\t{verified}\t{role}\n"
+
+
+def book_rows(rng: random.Random, first_id: int, count: int, authors: list[str], author_weights: list[float], publishers: list[str],
+              publisher_weights: list[float], language_weights: list[float], user_ids: range, owner_weights: list[float]):
+    picked_authors = rng.choices(authors, cum_weights=author_weights, k=count)
+    picked_publishers = rng.choices(publishers, cum_weights=publisher_weights, k=count)
+    picked_languages = rng.choices(LANGUAGES, cum_weights=language_weights, k=count)
+    picked_owners = rng.choices(user_ids, cum_weights=owner_weights, k=count)
+    for offset, book_id in enumerate(range(first_id, first_id + count)):
+        title = f"The {rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)} {book_id}"
+        published = (datetime(1900, 1, 1) + timedelta(days=rng.randrange(45000))).date().isoformat()
+        created_at = timestamp(rng)
+        updated_at = created_at + timedelta(seconds=rng.randrange(86400 * 30)) if rng.random() < 0.2 else created_at
+        yield (f"{book_id}\t{title}\t{picked_authors[offset]}\t{picked_publishers[offset]}\t{published}\t{rng.randint(40, 1500)}\t"
+               f"{picked_languages[offset]}\t{created_at.isoformat()}\t{updated_at.isoformat()}\t{picked_owners[offset]}\n")
+
+
+def token_rows(rng: random.Random, first_id: int, count: int):
+    for token_id in range(first_id, first_id + count):
+        yield f"{token_id}\ttoken-{token_id}-{rng.getrandbits(128):032x}\t{timestamp(rng).isoformat()}\n"
+
+
+def copy_rows(cursor, table: str, columns: list[str], rows) -> int:
+    """
+    Stream rows (tab separated text lines) into table with COPY.
+    :param cursor:
+    :param table:
+    :param columns:
+    :param rows: iterable of COPY text format lines
+    :return: number of rows copied
+    """
+    buffer = io.StringIO()
+    count = 0
+    for row in rows:
+        buffer.write(row)
+        count += 1
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+    return count
+
+
+def next_id(cursor, table: str) -> int:
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def reset_sequence(cursor, table: str):
+    cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))")
+
+
+def load(connection, table: str, columns: list[str], total: int, chunk_size: int, make_rows) -> int:
+    """
+    Load total rows into table, one COPY and commit per chunk.
+    :param connection:
+    :param table:
+    :param columns:
+    :param total: number of rows to generate
+    :param chunk_size:
+    :param make_rows: callable(chunk_index, first_id, count) returning row lines
+    :return: first generated id
+    """
+    with connection.cursor() as cursor:
+        first_id = next_id(cursor, table)
+    started = time.perf_counter()
+    for chunk, offset in enumerate(range(0, total, chunk_size)):
+        count = min(chunk_size, total - offset)
+        with connection.cursor() as cursor:
+            copy_rows(cursor, table, columns, make_rows(chunk, first_id + offset, count))
+        connection.commit()
+        elapsed = time.perf_counter() - started
+        print(f"{table}: {offset + count}/{total} rows ({(offset + count) / elapsed:,.0f} rows/s)", file=sys.stderr)
+    with connection.cursor() as cursor:
+        reset_sequence(cursor, table)
+    connection.commit()
+    return first_id
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", help="database url, defaults to the one built from the settings")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--blacklisted-tokens", type=int, default=50_000)
+    parser.add_argument("--authors", type=int, help="distinct authors, defaults to books / 25")
+    parser.add_argument("--publishers", type=int, help="distinct publishers, defaults to books / 2000")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of the author, publisher and owner distributions")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables before loading")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    from passlib.context import CryptContext
+
+    hashed_password = CryptContext(schemes=["bcrypt"], deprecated="auto").hash(PASSWORD)
+    authors = [person_name(index) for index in range(max(1, args.authors or args.books // 25))]
+    publishers = [publisher_name(index) for index in range(max(1, args.publishers or args.books // 2000))]
+    author_weights = zipf_cum_weights(len(authors), args.skew)
+    publisher_weights = zipf_cum_weights(len(publishers), args.skew)
+    language_weights = zipf_cum_weights(len(LANGUAGES), 1.5)
+
+    if args.dsn is None:
+        from app.db_connection import database_url
+
+        args.dsn = database_url()
+    connection = psycopg2.connect(args.dsn)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SET synchronous_commit = off")
+            if args.truncate:
+                # TRUNCATE fires no delete triggers, the counters and tombstones they maintain are emptied along with the books.
+                cursor.execute("TRUNCATE books, users, blacklisted_tokens, book_facets, book_tombstones RESTART IDENTITY CASCADE")
+        connection.commit()
+
+        first_user = load(connection, "users", ["id", "username", "email", "hashed_password", "is_active", "is_verified", "role"],
+                          args.users, args.chunk_size,
+                          lambda chunk, first_id, count: user_rows(chunk_rng(args.seed, "users", chunk), first_id, count, hashed_password))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM users")
+            user_ids = range(first_user if args.users else 1, cursor.fetchone()[0] + 1)
+        if not user_ids and args.books:
+            print("books need at least one user, pass --users", file=sys.stderr)
+            return 1
+        owner_weights = zipf_cum_weights(len(user_ids), args.skew)
+
+        load(connection, "books", ["id", "title", "author", "publisher", "published_date", "page_count", "language", "created_at",
+                                   "updated_at", "user_id"],
+             args.books, args.chunk_size,
+             lambda chunk, first_id, count: book_rows(chunk_rng(args.seed, "books", chunk), first_id, count, authors, author_weights,
+                                                      publishers, publisher_weights, language_weights, user_ids, owner_weights))
+        load(connection, "blacklisted_tokens", ["id", "token", "blacklisted_on"], args.blacklisted_tokens, args.chunk_size,
+             lambda chunk, first_id, count: token_rows(chunk_rng(args.seed, "tokens", chunk), first_id, count))
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE users")
+            cursor.execute("ANALYZE books")
+            cursor.execute("ANALYZE blacklisted_tokens")
+        connection.commit()
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())